@@ -1,4 +1,10 @@
 from fastapi import APIRouter
 from app.api.routes_main_agent import router as users_router
+from app.api.routes_events import router as events_router
+from app.api.routes_proposals import router as proposals_router
+from app.api.routes_metrics import router as metrics_router
 router = APIRouter()
 router.include_router(users_router, prefix="/users", tags=["users"])
+router.include_router(events_router, prefix="/events", tags=["events"])
+router.include_router(proposals_router, prefix="/proposals", tags=["proposals"])
+router.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
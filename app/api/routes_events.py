@@ -0,0 +1,22 @@
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from app.event_bus.bus import get_event_bus
+
+router = APIRouter()
+
+
+@router.get("/dead-letters")
+async def list_dead_letters(event_type: Optional[str] = None, limit: int = 100):
+    events = await get_event_bus().list_dead_letters(event_type, limit)
+    return jsonable_encoder(events, custom_encoder={ObjectId: str})
+
+
+@router.post("/dead-letters/{event_id}/requeue")
+async def requeue_dead_letter(event_id: str):
+    if not await get_event_bus().requeue_dead_letter(event_id):
+        raise HTTPException(status_code=404, detail="Dead-lettered event not found")
+    return {"requeued": event_id}
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+
+from app.services.llm_gateway import get_gateway
+from app.services.prompt_builder import prompt_metrics
+
+router = APIRouter()
+
+
+@router.get("/llm")
+async def llm_metrics():
+    """Per-process LLM gateway counters (incl. response cache hit rate) and prompt sizes per prompt name"""
+    return {
+        "gateway": get_gateway().stats(),
+        "prompts": prompt_metrics.stats(),
+    }
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.event_bus.mongo_bus import get_rfp, get_workflow
+from app.listeners.proposal_listener import proposal_agent
+
+router = APIRouter()
+
+
+def _sse(event: str, data) -> str:
+    payload = json.dumps(jsonable_encoder(data, custom_encoder={ObjectId: str}))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@router.get("/{rfp_id}/stream")
+async def stream_proposal(rfp_id: str):
+    """
+    Server-sent events: `chunk` events carry {"section", "text"} in document
+    order, then one `complete` event with the assembled proposal (including
+    `proposal_markdown`). Needs the RFP's pricing stage to have completed.
+    """
+    rfp_doc = await asyncio.to_thread(get_rfp, rfp_id)
+    if rfp_doc is None:
+        raise HTTPException(status_code=404, detail="RFP not found")
+    workflow = await asyncio.to_thread(get_workflow, rfp_doc["_id"]) or {}
+    results = workflow.get("agent_results", {})
+    if "pricing" not in results:
+        raise HTTPException(status_code=409, detail="RFP has not been priced yet")
+
+    sales_output = rfp_doc["sales_output"]
+
+    async def events():
+        try:
+            async for item in proposal_agent.stream_rfp(
+                sales_output.get("title", ""),
+                sales_output.get("rfp_summary", ""),
+                results["pricing"],
+                scope=results.get("scope"),
+            ):
+                if item["section"] == "complete":
+                    yield _sse("complete", item["proposal"])
+                else:
+                    yield _sse("chunk", item)
+        except Exception as e:
+            yield _sse("error", {"detail": f"{type(e).__name__}: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,7 +4,7 @@ Uses environment variables for sensitive data
 """
 
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 import json
 from typing import Optional
@@ -94,6 +94,55 @@ class Settings(BaseSettings):
     # Workflow
     MAX_RETRIES: int = 3
     WORKFLOW_TIMEOUT: int = 300
+    RETRY_BACKOFF_BASE_SECONDS: float = 5.0
+    RETRY_BACKOFF_MAX_SECONDS: float = 600.0
+
+    # Pipeline: max concurrent runs of each DAG stage across all RFPs
+    PIPELINE_CONCURRENCY: Dict[str, int] = {
+        "technical": 4, "pricing": 4, "scope": 2, "legal": 2, "proposal": 2, "human": 4,
+    }
+
+    # Stage checkpoints older than this are recomputed on resume
+    CHECKPOINT_MAX_AGE_HOURS: int = 72
+
+    # Listener supervisor: concurrent handler calls per event type
+    # (RFP_RECEIVED = RFP workflows in flight at once)
+    LISTENER_CONCURRENCY: Dict[str, int] = {"RFP_RECEIVED": 10, "HUMAN_APPROVED": 2}
+    LISTENER_SWEEP_INTERVAL_SECONDS: int = 30
+
+    # Event bus: "mongo" (events collection) or "memory" (in-process asyncio queues)
+    EVENT_BUS_BACKEND: str = os.getenv("EVENT_BUS_BACKEND", "mongo")
+    # Write-ahead log for the memory backend; unset = no persistence
+    EVENT_BUS_WAL_PATH: Optional[str] = os.getenv("EVENT_BUS_WAL_PATH", None)
+    # Processed events move to monthly events_archive_YYYY_MM collections
+    EVENT_ARCHIVE_AFTER_HOURS: int = 24
+    EVENT_ARCHIVE_TTL_DAYS: int = 90
+    EVENT_ARCHIVE_INTERVAL_MINUTES: int = 60
+
+    # LLM gateway: concurrent provider calls overall and per model, and
+    # request pacing per model (requests/minute, sized to the quota)
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_MODEL_CONCURRENCY: Dict[str, int] = {"default": 8}
+    LLM_REQUESTS_PER_MINUTE: Dict[str, int] = {
+        "default": 60, "models/text-embedding-004": 1500,
+    }
+    # Cache of deterministic LLM responses (temperature 0 or opted in),
+    # in memory and in the llm_cache collection
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+    LLM_CACHE_TTL_HOURS: int = 168
+    LLM_CACHE_MAX_ITEMS: int = 100000
+
+    # LLM backend: "live", "record" (live + save responses as fixtures) or
+    # "replay" (fixtures only, no network). Replay can add synthetic latency
+    # and inject errors ("unavailable", "rate_limit", "timeout") to make
+    # pipeline performance runs repeatable
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "live")
+    LLM_FIXTURES_PATH: str = os.getenv("LLM_FIXTURES_PATH", "fixtures/llm")
+    LLM_REPLAY_LATENCY_MS: float = float(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+    LLM_REPLAY_JITTER_MS: float = float(os.getenv("LLM_REPLAY_JITTER_MS", "0"))
+    LLM_REPLAY_ERROR_RATE: float = float(os.getenv("LLM_REPLAY_ERROR_RATE", "0"))
+    LLM_REPLAY_ERROR: str = os.getenv("LLM_REPLAY_ERROR", "unavailable")
+    LLM_REPLAY_SEED: int = int(os.getenv("LLM_REPLAY_SEED", "0"))
 
     # LLM Configuration (kept commented / optional)
     # LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "openai")
@@ -110,6 +159,48 @@ class Settings(BaseSettings):
     # VECTOR_DB_TYPE: str = os.getenv("VECTOR_DB_TYPE", "chroma")
     # EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 
+    # Product vector search: "atlas" ($vectorSearch), "local" (in-process
+    # exact NumPy index), "ann" (in-process IVF index, for large catalogs)
+    # or "auto" (Atlas, falling back to local when unavailable)
+    VECTOR_SEARCH_BACKEND: str = os.getenv("VECTOR_SEARCH_BACKEND", "auto")
+    # IVF index directory (memory-mapped) and clusters scanned per query;
+    # tune nprobe with `python -m app.services.ann_index --benchmark`
+    ANN_INDEX_PATH: str = os.getenv("ANN_INDEX_PATH", "data/ann_index")
+    ANN_NPROBE: int = 8
+    # Product embedding storage: "float32" (list of doubles, required by
+    # Atlas $vectorSearch), "float16" or "int8" (quantized BSON binary,
+    # local/ann backends only). Existing vectors are re-encoded with
+    # `python -m app.services.embedding_codec --migrate <dtype>`
+    EMBEDDING_STORAGE_DTYPE: str = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+    # "hybrid" prefilters products with a BM25 keyword index (name,
+    # description, category) and reranks only those candidates by vector
+    # score; "vector" searches the whole catalog by embedding alone.
+    # Fusion is "weighted" (HYBRID_FUSION_ALPHA * vector + rest * keyword)
+    # or "rrf" (reciprocal rank fusion)
+    PRODUCT_SEARCH_MODE: str = os.getenv("PRODUCT_SEARCH_MODE", "hybrid")
+    LEXICAL_CANDIDATES: int = 200
+    HYBRID_FUSION: str = os.getenv("HYBRID_FUSION", "weighted")
+    HYBRID_FUSION_ALPHA: float = 0.7
+
+    # Price book: entries are reloaded after the TTL, or immediately on
+    # product changes when watching (change streams need a replica set)
+    PRICE_BOOK_TTL_SECONDS: int = 600
+    PRICE_BOOK_WATCH: bool = os.getenv("PRICE_BOOK_WATCH", "True").lower() == "true"
+
+    # Per-section LLM timeout for proposal narrative; a section that times
+    # out or fails gets deterministic fallback text
+    PROPOSAL_SECTION_TIMEOUT_SECONDS: float = 60.0
+
+    # Legal review: clauses per LLM call and concurrent calls per RFP;
+    # verdicts for clauses seen before are reused from legal_clause_verdicts
+    LEGAL_CLAUSE_BATCH_SIZE: int = 20
+    LEGAL_REVIEW_CONCURRENCY: int = 4
+
+    # Token budget overrides for prompt inputs, keyed "<prompt>.<field>",
+    # e.g. {"executive_summary.rfp_summary": 1200, "legal_clauses.clause": 400}.
+    # Defaults live next to each prompt; see prompt_builder
+    PROMPT_BUDGETS: Dict[str, int] = {}
+
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -64,6 +64,11 @@ def init_db():
         
         logger.info(f"✓ Indexes created for {collection_name}")
 
+    # Event queue indexes and backfills live with the event bus database
+    if settings.EVENT_BUS_BACKEND == "mongo":
+        from app.db.migrations import run_migrations
+        run_migrations()
+
 def close_db():
     """Close MongoDB connection"""
     global _client
@@ -0,0 +1,46 @@
+"""Startup migrations for existing deployments"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from app.event_bus import mongo_bus
+
+logger = logging.getLogger(__name__)
+
+
+def _events_indexes(db):
+    """Partial index on unprocessed events, index on processed_at"""
+    mongo_bus.ensure_event_indexes()
+
+
+def _backfill_processed_at(db):
+    """Processed events written before archival existed have no processed_at"""
+    result = db["events"].update_many(
+        {"processed": True, "processed_at": {"$exists": False}},
+        [{"$set": {"processed_at": "$timestamp"}}],
+    )
+    logger.info(f"✓ Backfilled processed_at on {result.modified_count} events")
+
+
+# Applied in order, each exactly once per database
+MIGRATIONS: List[Tuple[str, Callable]] = [
+    ("0001_events_indexes", _events_indexes),
+    ("0002_backfill_processed_at", _backfill_processed_at),
+]
+
+
+def run_migrations():
+    """Apply pending migrations to the event bus database"""
+    db = mongo_bus.get_db()
+    applied_col = db["migrations"]
+    applied = {doc["_id"] for doc in applied_col.find({}, {"_id": 1})}
+
+    for name, migrate in MIGRATIONS:
+        if name in applied:
+            continue
+        logger.info(f"Applying migration {name}")
+        migrate(db)
+        applied_col.insert_one({"_id": name, "applied_at": datetime.utcnow()})
+
+    # Cheap when indexes already exist; keeps them in sync with code changes
+    mongo_bus.ensure_event_indexes()
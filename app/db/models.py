@@ -15,9 +15,23 @@ class WorkflowStage(str, Enum):
     DISCOVERY = "discovery"
     QUALIFICATION = "qualification"
     ANALYSIS = "analysis"
+    # Agent stages, one per node of STAGE_INPUTS in app/event_bus/event_types.py
+    TECHNICAL = "technical"
     PRICING = "pricing"
+    SCOPE = "scope"
+    LEGAL = "legal"
     PROPOSAL = "proposal"
+    HUMAN = "human"
     SUBMISSION = "submission"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class StageStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    SKIPPED = "skipped"  # an upstream stage failed or halted
 
 class RFPModel(BaseModel):
     """MongoDB document model for RFPs"""
@@ -43,6 +57,8 @@ class WorkflowModel(BaseModel):
     id: Optional[str] = Field(default=None, alias="_id")
     rfp_id: str
     current_stage: str = WorkflowStage.DISCOVERY
+    running_stages: List[str] = []  # DAG stages can run in parallel
+    stage_status: Dict[str, str] = {}  # stage -> StageStatus
     data: Optional[Dict[str, Any]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
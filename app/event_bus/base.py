@@ -0,0 +1,55 @@
+# app/event_bus/base.py
+
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional
+
+
+class EventBus(ABC):
+    """
+    Transport used to hand events between pipeline stages.
+
+    Events are plain dicts shaped like the Mongo documents:
+    `{"_id", "event_type", "payload", "timestamp", "processed"}`.
+    Every subscriber on the same event type competes for events, so each
+    event is delivered to one of them and must then be acked or nacked.
+
+    Backends whose deliveries expire set `lease_seconds`. A handler that
+    runs longer must call `extend` before the lease runs out, or the event
+    is handed to another worker.
+    """
+
+    lease_seconds: Optional[float] = None
+
+    @abstractmethod
+    async def publish(self, event_type: str, payload: dict):
+        """Publishes an event and returns its id."""
+
+    @abstractmethod
+    def subscribe(self, event_type: str, consumer: Optional[str] = None) -> AsyncIterator[dict]:
+        """Async iterator over events of `event_type` delivered to this worker."""
+
+    async def extend(self, event_id) -> bool:
+        """Renews this worker's lease on an event it is still handling. False if it was lost."""
+        return True
+
+    @abstractmethod
+    async def ack(self, event_id) -> bool:
+        """Marks an event as processed."""
+
+    @abstractmethod
+    async def nack(self, event_id, error: Optional[str] = None) -> bool:
+        """
+        Records a failed attempt. The event is redelivered after a capped
+        exponential backoff, or dead-lettered after `MAX_RETRIES` attempts.
+        """
+
+    @abstractmethod
+    async def list_dead_letters(self, event_type: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Events that exhausted their retries, newest first."""
+
+    @abstractmethod
+    async def requeue_dead_letter(self, event_id) -> bool:
+        """Puts a dead-lettered event back on the queue with its attempts reset."""
+
+    async def close(self):
+        """Flushes and releases backend resources."""
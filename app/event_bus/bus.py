@@ -0,0 +1,24 @@
+# app/event_bus/bus.py
+
+from typing import Optional
+
+from app.config.settings import settings
+from app.event_bus.base import EventBus
+
+_bus: Optional[EventBus] = None
+
+
+def get_event_bus() -> EventBus:
+    """Returns the process-wide EventBus selected by `EVENT_BUS_BACKEND`."""
+    global _bus
+    if _bus is None:
+        backend = settings.EVENT_BUS_BACKEND.lower()
+        if backend == "memory":
+            from app.event_bus.memory_bus import InMemoryEventBus
+            _bus = InMemoryEventBus(wal_path=settings.EVENT_BUS_WAL_PATH)
+        elif backend == "mongo":
+            from app.event_bus.mongo_bus import MongoEventBus
+            _bus = MongoEventBus()
+        else:
+            raise ValueError(f"Unknown EVENT_BUS_BACKEND: {settings.EVENT_BUS_BACKEND}")
+    return _bus
@@ -3,15 +3,50 @@ RFP_RECEIVED = "RFP_RECEIVED"
 
 TECHNICAL_DONE = "TECHNICAL_DONE"
 PRICING_DONE = "PRICING_DONE"
+SCOPE_DONE = "SCOPE_DONE"
 PROPOSAL_DONE = "PROPOSAL_DONE"
 LEGAL_APPROVED = "LEGAL_APPROVED"
 HUMAN_APPROVED = "HUMAN_APPROVED"
 
-# Event mapping (pipeline order)
-NEXT_EVENT = {
-    RFP_RECEIVED: TECHNICAL_DONE,
-    TECHNICAL_DONE: PRICING_DONE,
-    PRICING_DONE: PROPOSAL_DONE,
-    PROPOSAL_DONE: LEGAL_APPROVED,
-    LEGAL_APPROVED: HUMAN_APPROVED,
+# Stage DAG: each stage lists the stages whose output it consumes.
+# Stages with no inputs start as soon as the RFP is received; the others
+# start once all of their inputs are done, so independent branches
+# (technical → pricing, scope rewrite, legal review) run side by side.
+STAGE_INPUTS = {
+    "technical": [],
+    "pricing": ["technical"],
+    "scope": [],
+    "legal": [],
+    "proposal": ["pricing", "scope"],
+    "human": ["proposal", "legal"],
 }
+
+# Event emitted when a stage completes
+STAGE_DONE_EVENT = {
+    "technical": TECHNICAL_DONE,
+    "pricing": PRICING_DONE,
+    "scope": SCOPE_DONE,
+    "legal": LEGAL_APPROVED,
+    "proposal": PROPOSAL_DONE,
+    "human": HUMAN_APPROVED,
+}
+
+
+def downstream_stages(stage: str, stage_inputs: dict = None) -> list:
+    """Stages that directly consume `stage`'s output."""
+    stage_inputs = stage_inputs or STAGE_INPUTS
+    return [s for s, inputs in stage_inputs.items() if stage in inputs]
+
+
+def topological_order(stage_inputs: dict = None) -> list:
+    """Stages ordered so every stage comes after its inputs."""
+    stage_inputs = stage_inputs or STAGE_INPUTS
+    order, done = [], set()
+    while len(order) < len(stage_inputs):
+        ready = [s for s, inputs in stage_inputs.items()
+                 if s not in done and all(i in done for i in inputs)]
+        if not ready:
+            raise ValueError("STAGE_INPUTS contains a cycle")
+        order.extend(ready)
+        done.update(ready)
+    return order
@@ -0,0 +1,200 @@
+# app/event_bus/memory_bus.py
+
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import datetime
+import json
+import logging
+import os
+import uuid
+
+from app.config.settings import settings
+from app.event_bus.base import EventBus
+from app.event_bus.retry import retry_delay
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryEventBus(EventBus):
+    """
+    In-process EventBus backed by one asyncio.Queue per event type.
+
+    Stage handoff is a queue put/get on the same event loop, so there is no
+    network hop. All methods must be called from the loop that runs the
+    subscribers.
+
+    With `wal_path` set, every publish/ack/nack is appended to a JSON-lines
+    write-ahead log. On startup the log is replayed and every event that was
+    never acked is queued again, so a restart loses nothing. The log is
+    rewritten with only the pending events once `compact_after` acks have
+    accumulated.
+    """
+
+    def __init__(self, wal_path: Optional[str] = None, compact_after: int = 1000):
+        self.wal_path = wal_path
+        self.compact_after = compact_after
+
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._pending: Dict[str, dict] = {}  # published, not yet acked
+        self._dead: Dict[str, dict] = {}  # exhausted their retries
+        self._acked_since_compact = 0
+        self._wal = None
+
+        if wal_path:
+            self._replay()
+            self._wal = open(wal_path, "a", encoding="utf-8")
+
+    # --------------------------------------------------
+    # Write-ahead log
+    # --------------------------------------------------
+    def _replay(self):
+        if not os.path.exists(self.wal_path):
+            return
+
+        with open(self.wal_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final write from a crash; everything before it is intact
+                    logger.warning("Skipping corrupt WAL record in %s", self.wal_path)
+                    continue
+
+                op = record["op"]
+                if op in ("publish", "dead"):
+                    event = record["event"]
+                    for field in ("timestamp", "failed_at"):
+                        if event.get(field):
+                            event[field] = datetime.datetime.fromisoformat(event[field])
+                    if op == "publish":
+                        self._pending[event["_id"]] = event
+                    else:
+                        self._pending.pop(event["_id"], None)
+                        self._dead[event["_id"]] = event
+                elif op == "ack":
+                    self._pending.pop(record["_id"], None)
+                elif op == "nack" and record["_id"] in self._pending:
+                    self._pending[record["_id"]]["attempts"] = record["attempts"]
+                elif op == "requeue" and record["_id"] in self._dead:
+                    event = self._dead.pop(record["_id"])
+                    event["attempts"] = 0
+                    self._pending[event["_id"]] = event
+
+        # Backoff timers do not survive a restart; retry pending events now
+        for event in self._pending.values():
+            self._queue(event["event_type"]).put_nowait(event)
+
+        logger.info("Replayed %d pending events from %s", len(self._pending), self.wal_path)
+        self._compact()
+
+    def _append(self, record: dict):
+        if self._wal is None:
+            return
+        self._wal.write(json.dumps(record, default=str) + "\n")
+        self._wal.flush()
+
+    def _compact(self):
+        tmp_path = f"{self.wal_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for event in self._pending.values():
+                f.write(json.dumps({"op": "publish", "event": event}, default=str) + "\n")
+            for event in self._dead.values():
+                f.write(json.dumps({"op": "dead", "event": event}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self._wal is not None:
+            self._wal.close()
+        os.replace(tmp_path, self.wal_path)
+        if self._wal is not None:
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._acked_since_compact = 0
+
+    # --------------------------------------------------
+    # EventBus
+    # --------------------------------------------------
+    def _queue(self, event_type: str) -> asyncio.Queue:
+        if event_type not in self._queues:
+            self._queues[event_type] = asyncio.Queue()
+        return self._queues[event_type]
+
+    async def publish(self, event_type: str, payload: dict):
+        event = {
+            "_id": uuid.uuid4().hex,
+            "event_type": event_type,
+            "payload": payload,
+            "timestamp": datetime.datetime.utcnow(),
+            "processed": False,
+            "attempts": 0,
+        }
+        self._append({"op": "publish", "event": event})
+        self._pending[event["_id"]] = event
+        self._queue(event_type).put_nowait(event)
+        return event["_id"]
+
+    async def subscribe(self, event_type: str, consumer: Optional[str] = None) -> AsyncIterator[dict]:
+        queue = self._queue(event_type)
+        while True:
+            yield await queue.get()
+
+    async def ack(self, event_id) -> bool:
+        event = self._pending.pop(event_id, None)
+        if event is None:
+            return False
+        event["processed"] = True
+        self._append({"op": "ack", "_id": event_id})
+
+        self._acked_since_compact += 1
+        if self._wal is not None and self._acked_since_compact >= self.compact_after:
+            self._compact()
+        return True
+
+    async def nack(self, event_id, error: Optional[str] = None) -> bool:
+        event = self._pending.get(event_id)
+        if event is None:
+            return False
+
+        event["attempts"] = event.get("attempts", 0) + 1
+        event["last_error"] = error
+
+        if event["attempts"] >= settings.MAX_RETRIES:
+            del self._pending[event_id]
+            event["failed_at"] = datetime.datetime.utcnow()
+            self._dead[event_id] = event
+            self._append({"op": "dead", "event": event})
+            logger.error(
+                "Event %s (%s) dead-lettered after %d attempts: %s",
+                event_id, event["event_type"], event["attempts"], error,
+            )
+            return True
+
+        self._append({"op": "nack", "_id": event_id, "attempts": event["attempts"]})
+        delay = retry_delay(event["attempts"])
+        asyncio.get_running_loop().call_later(
+            delay, self._queue(event["event_type"]).put_nowait, event
+        )
+        return True
+
+    async def list_dead_letters(self, event_type: Optional[str] = None, limit: int = 100) -> List[dict]:
+        dead = [ev for ev in self._dead.values() if event_type is None or ev["event_type"] == event_type]
+        dead.sort(key=lambda ev: ev["failed_at"], reverse=True)
+        return dead[:limit]
+
+    async def requeue_dead_letter(self, event_id) -> bool:
+        event = self._dead.pop(event_id, None)
+        if event is None:
+            return False
+        event["attempts"] = 0
+        event.pop("failed_at", None)
+        self._pending[event_id] = event
+        self._append({"op": "requeue", "_id": event_id})
+        self._queue(event["event_type"]).put_nowait(event)
+        return True
+
+    async def close(self):
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
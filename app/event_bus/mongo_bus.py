@@ -1,40 +1,877 @@
 # app/event_bus/mongo_bus.py
 
-from pymongo import MongoClient
+from concurrent.futures import Future
+from typing import AsyncIterator, List, Optional
+from pymongo import ASCENDING, MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from pymongo.write_concern import WriteConcern
 from bson import ObjectId
+from app.config.settings import settings
+from app.event_bus.base import EventBus
+from app.event_bus.retry import retry_delay
+import asyncio
+import atexit
 import datetime
+import logging
 import os
+import socket
+import threading
+import time
+import uuid
 
 
 MONGO_URL = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+EVENT_DB = "rfp"
 
-client = MongoClient(MONGO_URL)
-db = client["rfp"]
+logger = logging.getLogger(__name__)
 
-events = db["events"]  # Event queue
-rfps = db["rfps"]      # RFP state storage
+# Connected lazily so importing the bus (or choosing another backend)
+# does not require a reachable MongoDB.
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
 
 
-def publish_event(event_type: str, payload: dict):
-    event = {
-        "event_type": event_type,
-        "payload": payload,
-        "timestamp": datetime.datetime.utcnow(),
-        "processed": False,
-    }
-    events.insert_one(event)
-    print(f"[EVENT EMIT] {event_type} → {payload}")
+def get_db():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(MONGO_URL)
+    return _client[EVENT_DB]
+
+
+def _events():
+    return get_db()["events"]  # Event queue
+
+
+def _rfps():
+    return get_db()["rfps"]  # RFP state storage
+
+
+def _cursors():
+    return get_db()["event_cursors"]  # Change stream resume tokens per consumer
+
+
+def __getattr__(name):
+    # Backwards compatible module attributes (`from mongo_bus import events`)
+    if name == "client":
+        get_db()
+        return _client
+    if name == "db":
+        return get_db()
+    if name in ("events", "rfps", "cursors"):
+        return {"events": _events, "rfps": _rfps, "cursors": _cursors}[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Server error codes meaning "change streams are unavailable here"
+# (standalone mongod / no oplog) or "the resume token fell off the oplog".
+_NO_CHANGE_STREAM_CODES = {40573, 40324}
+_HISTORY_LOST_CODES = {136, 280, 286}
+
+POLL_MIN_INTERVAL = 0.1
+POLL_MAX_INTERVAL = 5.0
+WATCH_MAX_AWAIT_MS = 1000
+
+LEASE_SECONDS = 60
+RECLAIM_INTERVAL = 5.0  # also how often delayed retries are picked up
+
+PUBLISH_BATCH_SIZE = 100
+PUBLISH_MAX_DELAY = 0.05  # seconds an event may wait for its batch to fill
+
+
+# --------------------------------------------------
+# Publishing
+# --------------------------------------------------
+class BatchPublisher:
+    """
+    Coalesces published events into `insert_many` calls.
+
+    A batch is written when it reaches `max_batch` events or when the oldest
+    queued event has waited `max_delay` seconds, whichever comes first.
+    `publish` returns a Future that resolves to the inserted `_id` once the
+    batch is acknowledged. With `durable=True` the ack waits for a majority,
+    journaled write instead of the collection's default write concern.
+    """
+
+    def __init__(
+        self,
+        collection=None,
+        max_batch: int = PUBLISH_BATCH_SIZE,
+        max_delay: float = PUBLISH_MAX_DELAY,
+        durable: bool = False,
+    ):
+        collection = collection if collection is not None else _events()
+        if durable:
+            collection = collection.with_options(write_concern=WriteConcern(w="majority", j=True))
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._full = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def publish(self, event_type: str, payload: dict) -> Future:
+        event = {
+            "event_type": event_type,
+            "payload": payload,
+            "timestamp": datetime.datetime.utcnow(),
+            "processed": False,
+            "attempts": 0,
+        }
+        event["next_attempt_at"] = event["timestamp"]
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchPublisher is closed")
+            self._pending.append((event, future))
+            full = len(self._pending) >= self.max_batch
+        # Writes always happen on the background thread, so publishing never
+        # blocks the caller (often the event loop) on insert_many
+        if full:
+            self._full.set()
+        self._wakeup.set()
+        return future
+
+    def flush(self) -> int:
+        """Synchronously writes everything queued so far. Returns events written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            docs = [event for event, _ in batch]
+            try:
+                result = self.collection.insert_many(docs, ordered=False)
+                inserted_ids = result.inserted_ids
+                failed = {}
+            except BulkWriteError as e:
+                failed = {err["index"]: e for err in e.details.get("writeErrors", [])}
+                inserted_ids = [doc.get("_id") for doc in docs]
+            except PyMongoError as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                logger.error("Event batch publish failed", extra={"batch_size": len(batch), "error": str(e)})
+                return 0
+
+            for i, (_, future) in enumerate(batch):
+                if i in failed:
+                    future.set_exception(failed[i])
+                else:
+                    future.set_result(inserted_ids[i])
+
+            counts = {}
+            for doc in docs:
+                counts[doc["event_type"]] = counts.get(doc["event_type"], 0) + 1
+            logger.info(
+                "Published %d events", len(docs) - len(failed),
+                extra={"batch_size": len(docs), "failed": len(failed), "event_types": counts},
+            )
+            return len(docs) - len(failed)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                break
+            # A full batch cuts the wait short
+            self._full.wait(self.max_delay)
+            self._full.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Background event flush failed")
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._full.set()
+        self._thread.join()
+        self.flush()
+
+
+_publisher: Optional[BatchPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher() -> BatchPublisher:
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = BatchPublisher()
+            atexit.register(_publisher.close)
+    return _publisher
+
+
+def publish_event(event_type: str, payload: dict, wait: bool = False):
+    """
+    Queues an event on the shared batching publisher.
+    With `wait=True` the batch is flushed right away and the inserted `_id`
+    is returned once MongoDB acknowledges it.
+    """
+    future = get_publisher().publish(event_type, payload)
+    if wait:
+        get_publisher().flush()
+        return future.result()
+    return future
+
+
+def flush_events() -> int:
+    """Writes any buffered events now."""
+    return get_publisher().flush()
 
 
 def fetch_unprocessed_events(event_type: str):
-    return list(events.find(
+    return list(_events().find(
         {"event_type": event_type, "processed": False}
     ))
 def fetch_rpfs(status_type: str):
-    return list(rfps.find(
+    return list(_rfps().find(
         {"status": status_type}
     ))
 
 
-def mark_event_processed(event_id):
-    events.update_one({ "_id": ObjectId(event_id) }, { "$set": { "processed": True } })
+def _workflows():
+    return get_db()["workflows"]  # WorkflowModel documents, one per RFP
+
+
+def save_workflow(state: dict):
+    """Upserts the workflow document for `state["rfp_id"]`."""
+    fields = {k: v for k, v in state.items() if k != "created_at"}
+    _workflows().update_one(
+        {"rfp_id": state["rfp_id"]},
+        {"$set": fields, "$setOnInsert": {"created_at": state.get("created_at", datetime.datetime.utcnow())}},
+        upsert=True,
+    )
+
+
+def get_workflow(rfp_id) -> Optional[dict]:
+    if isinstance(rfp_id, str) and ObjectId.is_valid(rfp_id):
+        return _workflows().find_one({"rfp_id": {"$in": [rfp_id, ObjectId(rfp_id)]}})
+    return _workflows().find_one({"rfp_id": rfp_id})
+
+
+def _rfp_filter(rfp_id) -> dict:
+    # RFP ids travel through event payloads as strings; SalesAgent documents
+    # use ObjectId keys while RFPRepository uses "rfp_xxxxxxxx" strings.
+    if isinstance(rfp_id, str) and ObjectId.is_valid(rfp_id):
+        return {"_id": {"$in": [rfp_id, ObjectId(rfp_id)]}}
+    return {"_id": rfp_id}
+
+
+def get_rfp(rfp_id) -> Optional[dict]:
+    return _rfps().find_one(_rfp_filter(rfp_id))
+
+
+def take_rfp_with_status(
+    status: str,
+    new_status: str,
+    stale_after: Optional[datetime.timedelta] = None,
+) -> Optional[dict]:
+    """
+    Atomically moves one RFP from `status` to `new_status` and returns it.
+    With `stale_after`, an RFP left in `new_status` for longer than that
+    (whoever took it died) is taken again as well.
+    """
+    now = datetime.datetime.utcnow()
+    query = {"status": status}
+    if stale_after is not None:
+        query = {"$or": [query, {"status": new_status, "updated_at": {"$lt": now - stale_after}}]}
+    return _rfps().find_one_and_update(
+        query,
+        {"$set": {"status": new_status, "updated_at": now}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def set_rfp_status(rfp_id, status: str, expected: Optional[str] = None, **fields) -> bool:
+    """Sets the RFP status; with `expected`, only while the status is still that."""
+    query = _rfp_filter(rfp_id)
+    if expected is not None:
+        query["status"] = expected
+    result = _rfps().update_one(
+        query,
+        {"$set": {"status": status, "updated_at": datetime.datetime.utcnow(), **fields}},
+    )
+    return result.modified_count == 1
+
+
+def mark_event_processed(event_id, owner: Optional[str] = None) -> bool:
+    """
+    Marks an event done and drops its lease. When `owner` is given the update
+    only applies while that worker still holds the lease, so a worker whose
+    lease expired cannot ack an event someone else has taken over.
+    """
+    query = {"_id": ObjectId(event_id)}
+    if owner is not None:
+        query["lease_owner"] = owner
+    result = _events().update_one(query, {
+        "$set": {"processed": True, "processed_at": datetime.datetime.utcnow()},
+        "$unset": {"lease_owner": "", "lease_expires_at": ""},
+    })
+    return result.modified_count == 1
+
+
+# --------------------------------------------------
+# Competing-consumer leases
+# --------------------------------------------------
+_PROCESS_TOKEN = uuid.uuid4().hex[:6]
+
+
+def default_owner() -> str:
+    """Unique worker id: host, pid and a random suffix per process."""
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_TOKEN}"
+
+
+def _claimable(now: datetime.datetime) -> dict:
+    # Free events, or events whose holder stopped renewing its lease,
+    # that are not waiting out a retry backoff
+    return {
+        "processed": False,
+        "$and": [
+            {"$or": [
+                {"lease_owner": None},
+                {"lease_expires_at": {"$lt": now}},
+            ]},
+            {"$or": [
+                {"next_attempt_at": None},
+                {"next_attempt_at": {"$lte": now}},
+            ]},
+        ],
+    }
+
+
+def _claim(query: dict, owner: str, lease_seconds: int, exclude: Optional[set] = None) -> Optional[dict]:
+    now = datetime.datetime.utcnow()
+    query = {**query, **_claimable(now)}
+    if exclude:
+        # Events this worker is still handling; their lease only looks expired
+        query["$and"] = query["$and"] + [{"_id": {"$nin": list(exclude)}}]
+    return _events().find_one_and_update(
+        query,
+        {
+            "$set": {
+                "lease_owner": owner,
+                "lease_expires_at": now + datetime.timedelta(seconds=lease_seconds),
+                "claimed_at": now,
+            },
+            "$inc": {"claim_count": 1},
+        },
+        sort=[("timestamp", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def claim_event(
+    event_type: str,
+    owner: str,
+    lease_seconds: int = LEASE_SECONDS,
+    exclude: Optional[set] = None,
+) -> Optional[dict]:
+    """
+    Atomically claims the oldest free (or lease-expired) event of a type,
+    skipping the ids in `exclude`.
+    """
+    return _claim({"event_type": event_type}, owner, lease_seconds, exclude)
+
+
+def claim_events(event_type: str, owner: str, n: int, lease_seconds: int = LEASE_SECONDS) -> List[dict]:
+    """Claims up to `n` events. Each claim is atomic on its own document."""
+    claimed = []
+    for _ in range(n):
+        ev = claim_event(event_type, owner, lease_seconds)
+        if ev is None:
+            break
+        claimed.append(ev)
+    return claimed
+
+
+def claim_event_by_id(
+    event_id,
+    owner: str,
+    lease_seconds: int = LEASE_SECONDS,
+    exclude: Optional[set] = None,
+) -> Optional[dict]:
+    """Claims one specific event, e.g. one delivered by a change stream."""
+    if exclude and ObjectId(event_id) in exclude:
+        return None
+    return _claim({"_id": ObjectId(event_id)}, owner, lease_seconds)
+
+
+def renew_lease(event_id, owner: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+    """Extends a lease we still hold. Returns False if it was lost."""
+    result = _events().update_one(
+        {"_id": ObjectId(event_id), "lease_owner": owner, "processed": False},
+        {"$set": {
+            "lease_expires_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=lease_seconds),
+        }},
+    )
+    return result.modified_count == 1
+
+
+def release_event(event_id, owner: str) -> bool:
+    """Gives an unfinished event back to the pool without marking it processed."""
+    result = _events().update_one(
+        {"_id": ObjectId(event_id), "lease_owner": owner},
+        {"$unset": {"lease_owner": "", "lease_expires_at": ""}},
+    )
+    return result.modified_count == 1
+
+
+class LeaseHeartbeat:
+    """
+    Renews a lease from a background thread while the event is being worked on.
+
+        with LeaseHeartbeat(ev["_id"], owner) as hb:
+            run_agent(ev)
+        if hb.lost:
+            ...  # someone else took over, do not ack
+    """
+
+    def __init__(self, event_id, owner: str, lease_seconds: int = LEASE_SECONDS):
+        self.event_id = event_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._stop.wait(interval):
+            try:
+                if not renew_lease(self.event_id, self.owner, self.lease_seconds):
+                    self.lost = True
+                    logger.warning("Lost lease on event %s", self.event_id)
+                    return
+            except PyMongoError as e:
+                logger.warning("Lease renewal failed for %s: %s", self.event_id, e)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+# --------------------------------------------------
+# Retries & dead letters
+# --------------------------------------------------
+def _dead_letters():
+    return get_db()["dead_letter_events"]
+
+
+def fail_event(
+    event_id,
+    owner: Optional[str] = None,
+    error: Optional[str] = None,
+    max_retries: Optional[int] = None,
+) -> str:
+    """
+    Records a failed attempt. The event is rescheduled after a backoff, or
+    moved to `dead_letter_events` once it has failed `max_retries` times.
+    Returns "retry", "dead_letter" or "ignored" (unknown event / lease lost).
+    """
+    max_retries = settings.MAX_RETRIES if max_retries is None else max_retries
+    now = datetime.datetime.utcnow()
+
+    query = {"_id": ObjectId(event_id), "processed": False}
+    if owner is not None:
+        query["lease_owner"] = owner
+
+    ev = _events().find_one_and_update(
+        query,
+        {
+            "$inc": {"attempts": 1},
+            "$set": {"last_error": error, "last_failed_at": now},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if ev is None:
+        return "ignored"
+
+    if ev["attempts"] < max_retries:
+        # The lease is only dropped together with the new schedule, so no
+        # other worker can grab the event before its backoff is in place
+        delay = retry_delay(ev["attempts"])
+        _events().update_one(
+            {"_id": ev["_id"]},
+            {
+                "$set": {"next_attempt_at": now + datetime.timedelta(seconds=delay)},
+                "$unset": {"lease_owner": "", "lease_expires_at": ""},
+            },
+        )
+        logger.warning(
+            "Event %s (%s) failed attempt %d, retrying in %.1fs: %s",
+            ev["_id"], ev["event_type"], ev["attempts"], delay, error,
+        )
+        return "retry"
+
+    ev["failed_at"] = now
+    ev.pop("lease_owner", None)
+    ev.pop("lease_expires_at", None)
+    _dead_letters().replace_one({"_id": ev["_id"]}, ev, upsert=True)
+    _events().delete_one({"_id": ev["_id"]})
+    logger.error(
+        "Event %s (%s) dead-lettered after %d attempts: %s",
+        ev["_id"], ev["event_type"], ev["attempts"], error,
+    )
+    return "dead_letter"
+
+
+def list_dead_letters(event_type: Optional[str] = None, limit: int = 100) -> List[dict]:
+    query = {"event_type": event_type} if event_type else {}
+    return list(_dead_letters().find(query).sort("failed_at", -1).limit(limit))
+
+
+def requeue_dead_letter(event_id) -> bool:
+    """Moves a dead-lettered event back onto the queue with a fresh attempt budget."""
+    if not ObjectId.is_valid(event_id):
+        return False
+    ev = _dead_letters().find_one({"_id": ObjectId(event_id)})
+    if ev is None:
+        return False
+
+    ev.pop("failed_at", None)
+    ev.update({
+        "processed": False,
+        "attempts": 0,
+        "next_attempt_at": datetime.datetime.utcnow(),
+        "requeued_at": datetime.datetime.utcnow(),
+    })
+    _events().replace_one({"_id": ev["_id"]}, ev, upsert=True)
+    _dead_letters().delete_one({"_id": ev["_id"]})
+    logger.info("Requeued dead-lettered event %s (%s)", ev["_id"], ev["event_type"])
+    return True
+
+
+# --------------------------------------------------
+# Push-based subscription
+# --------------------------------------------------
+def _cursor_id(event_type: str, consumer: Optional[str]) -> str:
+    return f"{consumer or 'default'}:{event_type}"
+
+
+def load_resume_token(event_type: str, consumer: Optional[str] = None) -> Optional[dict]:
+    doc = _cursors().find_one({"_id": _cursor_id(event_type, consumer)})
+    return doc.get("resume_token") if doc else None
+
+
+def save_resume_token(event_type: str, token: dict, consumer: Optional[str] = None):
+    _cursors().update_one(
+        {"_id": _cursor_id(event_type, consumer)},
+        {"$set": {"resume_token": token, "updated_at": datetime.datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def _open_change_stream(event_type: str, resume_token: Optional[dict]):
+    pipeline = [
+        {"$match": {
+            "operationType": "insert",
+            "fullDocument.event_type": event_type,
+        }}
+    ]
+    return _events().watch(
+        pipeline,
+        resume_after=resume_token,
+        max_await_time_ms=WATCH_MAX_AWAIT_MS,
+    )
+
+
+async def _deliverable(ev: dict, owner: Optional[str], exclude: Optional[set] = None) -> Optional[dict]:
+    """With an owner, an event is only handed out once this worker holds its lease."""
+    if owner is None:
+        return ev
+    return await asyncio.to_thread(claim_event_by_id, ev["_id"], owner, LEASE_SECONDS, exclude)
+
+
+async def _poll(
+    event_type: str,
+    seen: set,
+    owner: Optional[str] = None,
+    exclude: Optional[set] = None,
+) -> AsyncIterator[dict]:
+    """
+    Polling fallback for deployments without change streams.
+    Sleeps between polls with exponential backoff while the queue is idle
+    and snaps back to the minimum interval as soon as something arrives.
+    """
+    delay = POLL_MIN_INTERVAL
+    last_id: Optional[ObjectId] = None
+
+    while True:
+        query = {"event_type": event_type, "processed": False}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = await asyncio.to_thread(
+            lambda: list(_events().find(query).sort("_id", 1))
+        )
+
+        fresh = [ev for ev in batch if ev["_id"] not in seen]
+        for ev in fresh:
+            last_id = ev["_id"]
+            ev = await _deliverable(ev, owner, exclude)
+            if ev is not None:
+                yield ev
+
+        if owner is not None:
+            # Pick up events orphaned by workers whose lease expired
+            while (ev := await asyncio.to_thread(claim_event, event_type, owner, LEASE_SECONDS, exclude)) is not None:
+                fresh.append(ev)
+                yield ev
+
+        if fresh:
+            delay = POLL_MIN_INTERVAL
+        else:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_MAX_INTERVAL)
+
+
+async def subscribe(
+    event_type: str,
+    consumer: Optional[str] = None,
+    owner: Optional[str] = None,
+    exclude: Optional[set] = None,
+) -> AsyncIterator[dict]:
+    """
+    Async iterator over events of `event_type`.
+
+    Backed by a MongoDB change stream on `events`. The resume token is
+    persisted per (consumer, event_type) once the caller has finished with an
+    event, so a restarted worker picks up exactly where it stopped. Events
+    that were already unprocessed before the stream was opened are drained
+    first. Falls back to adaptive polling on a standalone mongod.
+
+    With `owner` set, workers compete: each event is claimed under a lease
+    before it is yielded, so it reaches exactly one of them, and events left
+    behind by a dead worker are reclaimed once their lease expires. Ack with
+    `mark_event_processed(ev["_id"], owner)`, and renew the lease with
+    `renew_lease` while handling takes longer than LEASE_SECONDS. `exclude`
+    is a live set of event ids this worker is still handling; they are
+    never claimed again, even if their lease has run out.
+
+    Usage:
+        async for ev in subscribe(RFP_RECEIVED, consumer="technical"):
+            ...
+            mark_event_processed(ev["_id"])
+    """
+    resume_token = await asyncio.to_thread(load_resume_token, event_type, consumer)
+
+    try:
+        stream = await asyncio.to_thread(_open_change_stream, event_type, resume_token)
+    except OperationFailure as e:
+        if e.code in _HISTORY_LOST_CODES and resume_token is not None:
+            logger.warning("Resume token for %s expired, reopening stream from now", event_type)
+            resume_token = None
+            stream = await asyncio.to_thread(_open_change_stream, event_type, None)
+        elif e.code in _NO_CHANGE_STREAM_CODES:
+            logger.info("Change streams unavailable, polling %s with backoff", event_type)
+            stream = None
+        else:
+            raise
+
+    # Drain the backlog. The stream is already open, so anything inserted
+    # from here on is delivered by the stream; duplicates are skipped.
+    seen = set()
+    backlog = await asyncio.to_thread(fetch_unprocessed_events, event_type)
+    for ev in backlog:
+        seen.add(ev["_id"])
+        ev = await _deliverable(ev, owner, exclude)
+        if ev is not None:
+            yield ev
+
+    if stream is None:
+        async for ev in _poll(event_type, seen, owner, exclude):
+            yield ev
+        return
+
+    last_sweep = time.monotonic()
+    try:
+        while True:
+            if owner is not None and time.monotonic() - last_sweep > RECLAIM_INTERVAL:
+                last_sweep = time.monotonic()
+                while (ev := await asyncio.to_thread(
+                    claim_event, event_type, owner, LEASE_SECONDS, exclude
+                )) is not None:
+                    yield ev
+
+            try:
+                change = await asyncio.to_thread(stream.try_next)
+            except PyMongoError as e:
+                logger.warning("Change stream for %s interrupted (%s), resuming", event_type, e)
+                stream.close()
+                await asyncio.sleep(POLL_MIN_INTERVAL)
+                stream = await asyncio.to_thread(_open_change_stream, event_type, resume_token)
+                continue
+
+            if change is None:
+                continue
+
+            ev = change["fullDocument"]
+            if ev["_id"] in seen:
+                seen.discard(ev["_id"])
+            else:
+                ev = await _deliverable(ev, owner, exclude)
+                if ev is not None:
+                    yield ev
+
+            resume_token = change["_id"]
+            await asyncio.to_thread(save_resume_token, event_type, resume_token, consumer)
+    finally:
+        stream.close()
+
+
+# --------------------------------------------------
+# Indexes & archival
+# --------------------------------------------------
+ARCHIVE_PREFIX = "events_archive_"
+
+
+def ensure_event_indexes():
+    """
+    Indexes for the `events` queue. The partial index only holds unprocessed
+    events, so consumer queries stay proportional to the backlog, not history.
+    """
+    events = _events()
+    events.create_index(
+        [("event_type", ASCENDING), ("timestamp", ASCENDING)],
+        name="unprocessed_by_type",
+        partialFilterExpression={"processed": False},
+    )
+    events.create_index(
+        [("processed_at", ASCENDING)],
+        name="processed_at",
+        partialFilterExpression={"processed": True},
+    )
+    _dead_letters().create_index(
+        [("event_type", ASCENDING), ("failed_at", ASCENDING)],
+        name="by_type_failed_at",
+    )
+
+
+def _archive_collection(processed_at: datetime.datetime, ttl_days: Optional[int]):
+    col = get_db()[f"{ARCHIVE_PREFIX}{processed_at:%Y_%m}"]
+    if ttl_days:
+        col.create_index(
+            [("archived_at", ASCENDING)],
+            name="archived_at_ttl",
+            expireAfterSeconds=ttl_days * 86400,
+        )
+    return col
+
+
+def archive_processed_events(
+    older_than: Optional[datetime.timedelta] = None,
+    ttl_days: Optional[int] = None,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Moves processed events out of `events` into monthly archive collections
+    (`events_archive_YYYY_MM`, by processed_at) that expire via a TTL index.
+    Safe to re-run: copies are inserted before the originals are deleted, and
+    duplicates from an interrupted earlier run are ignored.
+    Returns the number of events archived.
+    """
+    if older_than is None:
+        older_than = datetime.timedelta(hours=settings.EVENT_ARCHIVE_AFTER_HOURS)
+    if ttl_days is None:
+        ttl_days = settings.EVENT_ARCHIVE_TTL_DAYS
+
+    events = _events()
+    cutoff = datetime.datetime.utcnow() - older_than
+    archived = 0
+
+    while True:
+        batch = list(
+            events.find({"processed": True, "processed_at": {"$lt": cutoff}})
+            .sort("processed_at", ASCENDING)
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+
+        now = datetime.datetime.utcnow()
+        by_month = {}
+        for ev in batch:
+            ev["archived_at"] = now
+            by_month.setdefault(f"{ev['processed_at']:%Y_%m}", []).append(ev)
+
+        for docs in by_month.values():
+            try:
+                _archive_collection(docs[0]["processed_at"], ttl_days).insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    raise
+
+        result = events.delete_many({"_id": {"$in": [ev["_id"] for ev in batch]}})
+        archived += result.deleted_count
+
+    if archived:
+        logger.info("Archived %d processed events", archived)
+    return archived
+
+
+async def run_event_archiver(interval_minutes: Optional[int] = None):
+    """Background task that archives processed events periodically."""
+    interval_minutes = interval_minutes or settings.EVENT_ARCHIVE_INTERVAL_MINUTES
+    while True:
+        try:
+            await asyncio.to_thread(archive_processed_events)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Event archival failed: {str(e)}")
+        await asyncio.sleep(interval_minutes * 60)
+
+
+# --------------------------------------------------
+# EventBus backend
+# --------------------------------------------------
+class MongoEventBus(EventBus):
+    """EventBus over the `events` collection, using leases for delivery."""
+
+    lease_seconds = LEASE_SECONDS
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner or default_owner()
+        self._in_flight: set = set()  # delivered here, not yet acked/nacked
+
+    async def publish(self, event_type: str, payload: dict):
+        return await asyncio.wrap_future(publish_event(event_type, payload))
+
+    async def subscribe(self, event_type: str, consumer: Optional[str] = None) -> AsyncIterator[dict]:
+        async for ev in subscribe(event_type, consumer=consumer, owner=self.owner, exclude=self._in_flight):
+            self._in_flight.add(ev["_id"])
+            yield ev
+
+    async def extend(self, event_id) -> bool:
+        return await asyncio.to_thread(renew_lease, event_id, self.owner, self.lease_seconds)
+
+    async def ack(self, event_id) -> bool:
+        self._in_flight.discard(ObjectId(event_id))
+        return await asyncio.to_thread(mark_event_processed, event_id, self.owner)
+
+    async def nack(self, event_id, error: Optional[str] = None) -> bool:
+        self._in_flight.discard(ObjectId(event_id))
+        outcome = await asyncio.to_thread(fail_event, event_id, self.owner, error)
+        return outcome != "ignored"
+
+    async def list_dead_letters(self, event_type: Optional[str] = None, limit: int = 100) -> List[dict]:
+        return await asyncio.to_thread(list_dead_letters, event_type, limit)
+
+    async def requeue_dead_letter(self, event_id) -> bool:
+        return await asyncio.to_thread(requeue_dead_letter, event_id)
+
+    async def close(self):
+        await asyncio.to_thread(flush_events)
@@ -0,0 +1,17 @@
+# app/event_bus/retry.py
+
+import random
+
+from app.config.settings import settings
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Capped exponential backoff with jitter: the n-th retry waits between
+    half and all of min(max, base * 2^(n-1)) seconds.
+    """
+    delay = min(
+        settings.RETRY_BACKOFF_MAX_SECONDS,
+        settings.RETRY_BACKOFF_BASE_SECONDS * (2 ** max(attempt - 1, 0)),
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -1,36 +1,21 @@
 # app/listeners/human_listener.py
 
-import time
-import threading
+from app.event_bus.mongo_bus import set_rfp_status
+from app.event_bus.event_types import HUMAN_APPROVED
 
-from event_bus.mongo_bus import fetch_unprocessed_events, publish_event, mark_event_processed
-from event_bus.event_types import LEGAL_APPROVED, HUMAN_APPROVED
 
-from services.agents.human_agent import HumanAgent
+def handle(rfp_doc: dict, inputs: dict) -> dict:
+    """human stage: hand-off to the reviewer; approval arrives as an event"""
+    print(f"[HumanAgent] Awaiting final human approval for RFP {rfp_doc['_id']}")
+    return {
+        "status": "AWAITING_APPROVAL",
+        "proposal_markdown": inputs["proposal"]["proposal_markdown"],
+        "legal_review": inputs["legal"],
+    }
 
-human_agent = HumanAgent()
 
-
-def human_loop():
-    while True:
-        events = fetch_unprocessed_events(LEGAL_APPROVED)
-
-        for ev in events:
-            rfp_id = ev["payload"]["rfp_id"]
-
-            print(f"[HumanAgent] Final human approval for RFP {rfp_id}")
-
-            decision = human_agent.final_approve(rfp_id)
-
-            publish_event(HUMAN_APPROVED, {
-                "rfp_id": rfp_id,
-                "status": decision
-            })
-
-            mark_event_processed(ev["_id"])
-
-        time.sleep(1)
-
-
-def start():
-    threading.Thread(target=human_loop, daemon=True).start()
+def handle_approval(ev: dict):
+    """HUMAN_APPROVED event: record the reviewer's decision on the RFP"""
+    data = ev["payload"]
+    print(f"[HumanAgent] Final decision for RFP {data['rfp_id']}: {data.get('status')}")
+    set_rfp_status(data["rfp_id"], HUMAN_APPROVED, human_decision=data.get("status"))
@@ -1,61 +1,104 @@
-# app/listeners/pricing_listener.py
-
-import time
-import threading
-import os
-
-
-from app.event_bus.mongo_bus import fetch_rpfs
-from app.event_bus.event_types import PRICING_DONE, RFP_RECEIVED
-
-from app.services.agents.technical_agent import TechnicalAgent
-from app.services.agents.pricing_agent import PricingAgent
-from app.services.agents.proposal_agent import ProposalAgent
-from app.services.agents.legal_agent import LegalAgent
-from app.services.agents.sales_agent import SalesAgent
-
-sales_agent = SalesAgent(os.getenv("MONGO_URI", "mongodb://localhost:27017/"), db_name="rfp")
-print("gen ai api key:", os.getenv("GENAI_API_KEY", None))
-technical_agent = TechnicalAgent(
-    mongo_url=os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
-    db_name="rfp",
-    product_collection="products",
-    api_key=os.getenv("GENAI_API_KEY", None),
+# app/listeners/main_listener.py
+
+import asyncio
+from datetime import timedelta
+
+from app.config.settings import settings
+from app.db.models import WorkflowStage
+from app.event_bus.bus import get_event_bus
+from app.event_bus.mongo_bus import get_rfp, save_workflow, set_rfp_status, take_rfp_with_status
+from app.event_bus.event_types import RFP_RECEIVED, HUMAN_APPROVED
+
+from app.listeners import technical_listener, pricing_listener, proposal_listener, legal_listener, human_listener
+from app.listeners.supervisor import ListenerSupervisor
+from app.services.checkpoints import CheckpointStore
+from app.services.workflow_engine import WorkflowEngine
+
+# from app.services.agents.sales_agent import SalesAgent
+# sales_agent = SalesAgent(os.getenv("MONGO_URI", "mongodb://localhost:27017/"), db_name="rfp")
+
+ENQUEUING = "ENQUEUING"
+QUEUED = "QUEUED"
+ENQUEUE_STALE_AFTER = timedelta(minutes=5)
+AWAITING_APPROVAL = "AWAITING_APPROVAL"
+
+# One handler per node of STAGE_INPUTS: (rfp_doc, inputs from upstream stages) -> output
+STAGE_HANDLERS = {
+    "technical": technical_listener.handle,
+    "pricing": pricing_listener.handle,
+    "scope": proposal_listener.handle_scope,
+    "legal": legal_listener.handle,
+    "proposal": proposal_listener.handle,
+    "human": human_listener.handle,
+}
+
+
+def persist_workflow(state: dict):
+    save_workflow(state)
+
+    if state["current_stage"] == WorkflowStage.COMPLETED:
+        set_rfp_status(state["rfp_id"], AWAITING_APPROVAL)
+    elif state["current_stage"] == WorkflowStage.FAILED:
+        set_rfp_status(state["rfp_id"], "FAILED", errors=state.get("errors", {}))
+    else:
+        set_rfp_status(state["rfp_id"], "IN_PROGRESS")
+
+
+engine = WorkflowEngine(
+    handlers=STAGE_HANDLERS,
+    concurrency=settings.PIPELINE_CONCURRENCY,
+    on_update=persist_workflow,
+    checkpoints=CheckpointStore(max_age=timedelta(hours=settings.CHECKPOINT_MAX_AGE_HOURS)),
+    external_inputs={"pricing": pricing_listener.current_prices},
 )
-pricing_agent = PricingAgent(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
-proposal_agent = ProposalAgent("abcd-1234-efgh-5678")  # Dummy API key
-legal_agent = LegalAgent("abcd-1234-efgh-5678")  # Dummy API key
-
-def sequenctial_processing():
-
-    # Temporarily calling the sales agent manually for demo 
-    # sales_result = sales_agent.push_dummy_rfp()
-    # print("Sales Agent pushed RFP again:", sales_result)
-
-    rfps = fetch_rpfs(RFP_RECEIVED)
-    print("Main Listener fetched events:", len(rfps))
-
-    for rfp_doc in rfps:
-
-        print("Processing RFP ID:", rfp_doc["_id"])
-        tech_result = technical_agent.process_rfp(rfp_doc["sales_output"])
-        print("Technical Agent processed RFP:", tech_result)
-
-        break
-        # save_output(rfp_doc["_id"], "technical_output", tech_result)
-
-        if tech_result["status"] == "FAILED":
-            mark_event_processed(ev["_id"])
-            continue  # STOP PIPELINE
-
-        pricing_result = pricing_agent.get_prices(tech_result)
-        # save_output(rfp_doc["_id"], "pricing_output", pricing_result)
-
-        proposal_result = proposal_agent.find_products_by_sku(rfp_doc)
-        # save_output(rfp_doc["_id"], "proposal_output", proposal_result)
-
-        mark_event_processed(ev["_id"])
 
 
-def start():
-    threading.Thread(target=sequenctial_processing, daemon=True).start()
+async def handle_rfp_received(ev: dict):
+    """RFP_RECEIVED event: run the stage DAG for the RFP"""
+    rfp_id = ev["payload"]["rfp_id"]
+    rfp_doc = await asyncio.to_thread(get_rfp, rfp_id)
+    if rfp_doc is None:
+        print("RFP not found for event:", rfp_id)
+        return
+
+    state = await engine.run(rfp_doc)
+    if state["current_stage"] == WorkflowStage.FAILED:
+        # Raising nacks the event, so the RFP is retried with backoff
+        raise RuntimeError(f"Workflow failed: {state.get('errors') or state['stage_status']}")
+
+
+async def enqueue_received_rfps():
+    """
+    Periodic sweep: RFPs stored with status RFP_RECEIVED (e.g. pushed by the
+    SalesAgent) get an RFP_RECEIVED event.
+
+    An RFP is first moved to ENQUEUING, so only one sweep takes it. It moves
+    to QUEUED only once the event has been written. If the process dies in
+    between, the RFP is taken again after ENQUEUE_STALE_AFTER.
+    """
+    bus = get_event_bus()
+    while True:
+        enqueued = 0
+        while (rfp_doc := await asyncio.to_thread(
+            take_rfp_with_status, RFP_RECEIVED, ENQUEUING, ENQUEUE_STALE_AFTER
+        )) is not None:
+            rfp_id = rfp_doc["_id"]
+            try:
+                await bus.publish(RFP_RECEIVED, {"rfp_id": str(rfp_id)})
+            except Exception as e:
+                print("Main Listener could not enqueue RFP:", rfp_id, e)
+                await asyncio.to_thread(set_rfp_status, rfp_id, RFP_RECEIVED, expected=ENQUEUING)
+                break
+            # The workflow may already have moved the RFP on
+            await asyncio.to_thread(set_rfp_status, rfp_id, QUEUED, expected=ENQUEUING)
+            enqueued += 1
+        if enqueued:
+            print("Main Listener enqueued RFPs:", enqueued)
+        await asyncio.sleep(settings.LISTENER_SWEEP_INTERVAL_SECONDS)
+
+
+def register(supervisor: ListenerSupervisor):
+    concurrency = settings.LISTENER_CONCURRENCY
+    supervisor.register(RFP_RECEIVED, handle_rfp_received, concurrency.get(RFP_RECEIVED, 1), name="workflow")
+    supervisor.register(HUMAN_APPROVED, human_listener.handle_approval, concurrency.get(HUMAN_APPROVED, 1), name="human")
+    supervisor.register_job("rfp_sweep", enqueue_received_rfps)
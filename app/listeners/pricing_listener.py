@@ -1,38 +1,35 @@
 # app/listeners/pricing_listener.py
 
-import time
-import threading
-
-from event_bus.mongo_bus import fetch_unprocessed_events, publish_event, mark_event_processed
-from event_bus.event_types import TECHNICAL_DONE, PRICING_DONE
-
-from services.agents.pricing_agent import PricingAgent
-
-pricing_agent = PricingAgent()
-
-
-def pricing_loop():
-    while True:
-        events = fetch_unprocessed_events(TECHNICAL_DONE)
-
-        for ev in events:
-            data = ev["payload"]
-            rfp_id = data["rfp_id"]
-            sku_list = data["sku_list"]
-
-            print(f"[PricingAgent] Pricing for RFP {rfp_id}")
-
-            pricing_data = pricing_agent.get_prices(sku_list)
-
-            publish_event(PRICING_DONE, {
-                "rfp_id": rfp_id,
-                "pricing": pricing_data
-            })
-
-            mark_event_processed(ev["_id"])
-
-        time.sleep(1)
-
-
-def start():
-    threading.Thread(target=pricing_loop, daemon=True).start()
+import os
+
+from app.config.settings import settings
+from app.services.agents.pricing_agent import PricingAgent
+
+pricing_agent = PricingAgent(
+    os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+    db_name="rfp",  # same catalog the technical stage matches against
+    price_ttl=settings.PRICE_BOOK_TTL_SECONDS,
+    watch_prices=settings.PRICE_BOOK_WATCH,
+)
+
+
+def current_prices(rfp_doc: dict, inputs: dict) -> dict:
+    """Price book entries of the recommended SKUs; part of the pricing checkpoint fingerprint"""
+    skus = [rec.get("sku") for r in inputs["technical"]["data"].values() for rec in r["recommendations"]]
+    book = pricing_agent.price_book.get_many(s for s in skus if s)
+    return {sku: [entry.get("price"), entry.get("unit")] for sku, entry in sorted(book.items())}
+
+
+def handle(rfp_doc: dict, inputs: dict) -> list | None:
+    """pricing stage: recommended SKUs → priced line items"""
+    print(f"[PricingAgent] Pricing for RFP {rfp_doc['_id']}")
+
+    technical_data = inputs["technical"]["data"]
+    priced, subtotal = pricing_agent.get_prices(technical_data)
+    recommended = sum(len(r["recommendations"]) for r in technical_data.values())
+    if recommended and not priced:
+        # Returning None fails the stage instead of proposing an empty price table
+        print(f"[PricingAgent] None of {recommended} recommended SKUs found in the price book")
+        return None
+    print(f"[PricingAgent] {len(priced)} lines, subtotal {subtotal}")
+    return priced
@@ -1,38 +1,28 @@
 # app/listeners/proposal_listener.py
 
-import time
-import threading
+from app.config.settings import settings
+from app.services.agents.proposal_agent import ProposalAgent
 
-from event_bus.mongo_bus import fetch_unprocessed_events, publish_event, mark_event_processed
-from event_bus.event_types import PRICING_DONE, PROPOSAL_DONE
+proposal_agent = ProposalAgent(
+    "abcd-1234-efgh-5678",  # Dummy API key
+    section_timeout=settings.PROPOSAL_SECTION_TIMEOUT_SECONDS,
+    prompt_budgets=settings.PROMPT_BUDGETS,
+)
 
-from services.agents.proposal_agent import ProposalAgent
 
-proposal_agent = ProposalAgent()
+async def handle_scope(rfp_doc: dict, inputs: dict) -> str:
+    """scope stage: rewrite the RFP scope; independent of product matching"""
+    return await proposal_agent.build_scope_understanding_async(rfp_doc["sales_output"].get("rfp_summary", ""))
 
 
-def proposal_loop():
-    while True:
-        events = fetch_unprocessed_events(PRICING_DONE)
+async def handle(rfp_doc: dict, inputs: dict) -> dict:
+    """proposal stage: pricing + scope → proposal document"""
+    print(f"[ProposalAgent] Creating proposal for RFP {rfp_doc['_id']}")
 
-        for ev in events:
-            data = ev["payload"]
-            rfp_id = data["rfp_id"]
-            pricing = data["pricing"]
-
-            print(f"[ProposalAgent] Creating proposal for RFP {rfp_id}")
-
-            proposal_url = proposal_agent.build_proposal(rfp_id, pricing)
-
-            publish_event(PROPOSAL_DONE, {
-                "rfp_id": rfp_id,
-                "proposal_url": proposal_url
-            })
-
-            mark_event_processed(ev["_id"])
-
-        time.sleep(1)
-
-
-def start():
-    threading.Thread(target=proposal_loop, daemon=True).start()
+    sales_output = rfp_doc["sales_output"]
+    return await proposal_agent.process_rfp_async(
+        sales_output.get("title", ""),
+        sales_output.get("rfp_summary", ""),
+        inputs["pricing"],
+        scope=inputs["scope"],
+    )
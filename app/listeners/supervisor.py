@@ -0,0 +1,146 @@
+# app/listeners/supervisor.py
+
+import asyncio
+import inspect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.event_bus.base import EventBus
+
+logger = logging.getLogger(__name__)
+
+RESTART_MIN_DELAY = 1.0
+RESTART_MAX_DELAY = 60.0
+STABLE_AFTER = 60.0  # a run this long resets the restart backoff
+
+
+@dataclass
+class _Registration:
+    name: str
+    event_type: Optional[str]  # None for periodic/background jobs
+    handler: Callable[..., Any]
+    concurrency: int = 1
+    in_flight: set = field(default_factory=set)
+
+
+class ListenerSupervisor:
+    """
+    Runs every stage listener on one event loop.
+
+    `register(event_type, handler, concurrency)` subscribes to the event bus
+    once per event type and runs up to `concurrency` handler calls at a
+    time. A handler that returns normally acks the event; one that raises
+    nacks it (retry with backoff / dead letter). While a handler runs, its
+    lease is renewed every third of `bus.lease_seconds`. Sync handlers run
+    in a worker thread.
+
+    `register_job(name, factory)` runs a long-lived coroutine such as a
+    periodic sweep. If a subscription loop or job crashes it is restarted
+    with exponential backoff.
+    """
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._registrations: List[_Registration] = []
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    def register(self, event_type: str, handler: Callable[[dict], Any], concurrency: int = 1, name: Optional[str] = None):
+        self._registrations.append(
+            _Registration(name or event_type.lower(), event_type, handler, max(concurrency, 1))
+        )
+
+    def register_job(self, name: str, factory: Callable[[], Awaitable[None]]):
+        self._registrations.append(_Registration(name, None, factory))
+
+    # --------------------------------------------------
+    # Running
+    # --------------------------------------------------
+    async def _heartbeat(self, reg: _Registration, event_id):
+        """Keeps the lease on `event_id` alive while its handler runs."""
+        interval = max(self.bus.lease_seconds / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.bus.extend(event_id):
+                    logger.warning("Handler %s lost its lease on event %s", reg.name, event_id)
+                    return
+            except Exception as e:
+                logger.warning("Lease renewal failed for event %s: %s", event_id, e)
+
+    async def _handle(self, reg: _Registration, ev: dict, slots: asyncio.Semaphore):
+        heartbeat = None
+        if self.bus.lease_seconds:
+            heartbeat = asyncio.create_task(self._heartbeat(reg, ev["_id"]))
+        try:
+            try:
+                if inspect.iscoroutinefunction(reg.handler):
+                    await reg.handler(ev)
+                else:
+                    await asyncio.to_thread(reg.handler, ev)
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+        except Exception as e:
+            logger.exception("Handler %s failed on event %s", reg.name, ev["_id"])
+            await self.bus.nack(ev["_id"], error=f"{type(e).__name__}: {e}")
+        else:
+            await self.bus.ack(ev["_id"])
+        finally:
+            slots.release()
+
+    async def _consume(self, reg: _Registration):
+        slots = asyncio.Semaphore(reg.concurrency)
+        async for ev in self.bus.subscribe(reg.event_type, consumer=reg.name):
+            await slots.acquire()
+            task = asyncio.create_task(self._handle(reg, ev, slots))
+            reg.in_flight.add(task)
+            task.add_done_callback(reg.in_flight.discard)
+
+    async def _supervise(self, reg: _Registration):
+        delay = RESTART_MIN_DELAY
+        while not self._stopping:
+            started = time.monotonic()
+            try:
+                if reg.event_type is None:
+                    await reg.handler()
+                else:
+                    await self._consume(reg)
+                logger.warning("Listener %s exited, restarting", reg.name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Listener %s crashed, restarting in %.0fs", reg.name, delay)
+
+            if time.monotonic() - started > STABLE_AFTER:
+                delay = RESTART_MIN_DELAY
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESTART_MAX_DELAY)
+
+    async def start(self):
+        for reg in self._registrations:
+            self._tasks[reg.name] = asyncio.create_task(self._supervise(reg), name=f"listener-{reg.name}")
+        logger.info(
+            "Listener supervisor started: %s",
+            ", ".join(f"{r.name}×{r.concurrency}" for r in self._registrations),
+        )
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = None):
+        """Stops consuming; with `drain`, waits for handlers already running."""
+        self._stopping = True
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+        in_flight = [t for reg in self._registrations for t in reg.in_flight]
+        if in_flight:
+            if not drain:
+                for task in in_flight:
+                    task.cancel()
+            _, pending = await asyncio.wait(in_flight, timeout=timeout)
+            if pending:
+                logger.warning("%d handlers still running at shutdown", len(pending))
+        logger.info("Listener supervisor stopped")
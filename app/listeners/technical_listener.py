@@ -1,38 +1,34 @@
 # app/listeners/technical_listener.py
 
-import time
-import threading
-
-from app.event_bus.mongo_bus import fetch_unprocessed_events, publish_event, mark_event_processed
-from app.event_bus.event_types import RFP_RECEIVED, TECHNICAL_DONE
-
-# from app.services.agents.technical_agent import TechnicalAgent
-
-# tech_agent = TechnicalAgent()
-
-
-def technical_loop():
-    while True:
-        events = fetch_unprocessed_events(RFP_RECEIVED)
-        print("Technical Listener fetched events:", events)
-
-        for ev in events:
-            # rfp_id = ev["payload"]["rfp_id"]
-            # content = ev["payload"]["content"]
-
-            # print(f"[TechnicalAgent] Processing RFP {rfp_id}")
-
-            # sku_list = tech_agent.extract_requirements(content)
-
-            # publish_event(TECHNICAL_DONE, {
-            #     "rfp_id": rfp_id,
-            #     "sku_list": sku_list
-            # })
-
-            mark_event_processed(ev["_id"])
-
-        time.sleep(1)
-
-
-def start():
-    threading.Thread(target=technical_loop, daemon=True).start()
+import os
+
+from app.config.settings import settings
+from app.services.agents.technical_agent import TechnicalAgent
+
+print("GenAI API key configured:", bool(os.getenv("GENAI_API_KEY")))
+technical_agent = TechnicalAgent(
+    mongo_url=os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+    db_name="rfp",
+    product_collection="products",
+    api_key=os.getenv("GENAI_API_KEY", None),
+    vector_backend=settings.VECTOR_SEARCH_BACKEND,
+    ann_index_path=settings.ANN_INDEX_PATH,
+    ann_nprobe=settings.ANN_NPROBE,
+    embedding_dtype=settings.EMBEDDING_STORAGE_DTYPE,
+    search_mode=settings.PRODUCT_SEARCH_MODE,
+    lexical_candidates=settings.LEXICAL_CANDIDATES,
+    fusion=settings.HYBRID_FUSION,
+    fusion_alpha=settings.HYBRID_FUSION_ALPHA,
+)
+
+
+def handle(rfp_doc: dict, inputs: dict) -> dict | None:
+    """technical stage: requirement → product matches"""
+    print(f"[TechnicalAgent] Processing RFP {rfp_doc['_id']}")
+
+    tech_result = technical_agent.process_rfp(rfp_doc["sales_output"])
+    print("Technical Agent processed RFP:", tech_result["status"], tech_result["message"])
+
+    if tech_result["status"] == "FAILED":
+        return None  # STOP this branch of the DAG
+    return tech_result
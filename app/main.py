@@ -25,12 +25,9 @@ from app.services.discovery_scheduler import DiscoveryScheduler
 from app.db.database import init_db, close_db  
 
 from app.config.settings import settings
-# from app.listeners.technical_listener import start as tech_start
-# from app.listeners.pricing_listener import start as pricing_start
-# from app.listeners.proposal_listener import start as proposal_start
-# from app.listeners.legal_listener import start as legal_start
-# from app.listeners.human_listener import start as human_start
-from app.listeners.main_listener import start as main_listener
+from app.event_bus.bus import get_event_bus
+from app.listeners.main_listener import register as register_listeners
+from app.listeners.supervisor import ListenerSupervisor
 
 # Optional DB module: we'll import with try/except so app still works without DB.
 try:
@@ -42,18 +39,19 @@ except Exception:
 logger = logging.getLogger(__name__)
 discovery_task = None
 discovery_scheduler = None
+archiver_task = None
+supervisor = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     logger.info("Starting app %s %s", settings.APP_NAME, settings.APP_VERSION)
 
-    global discovery_task, discovery_scheduler
-    import google.generativeai as genai
+    global discovery_task, discovery_scheduler, archiver_task, supervisor
+    from app.services.llm_gateway import get_gateway
 
     print("Configuring GenAI with API Key:", settings.GENAI_API_KEY is not None)
-    print("GENAI_API_KEY value (first 5 chars):", settings.GENAI_API_KEY[:5] if settings.GENAI_API_KEY else "None")
 
-    genai.configure(api_key=settings.GENAI_API_KEY)
+    get_gateway().configure(settings.GENAI_API_KEY)
 
     # DB Connect
     try:
@@ -62,6 +60,10 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     except Exception as e:
         logger.error(f"Failed to initialize MongoDB: {str(e)}")
 
+    if settings.EVENT_BUS_BACKEND == "mongo":
+        from app.event_bus.mongo_bus import run_event_archiver
+        archiver_task = asyncio.create_task(run_event_archiver())
+
     try:
         email_config = None
         print(f"DEBUG: Enabled={settings.EMAIL_ENABLED}, Email={settings.EMAIL_ADDRESS}, Pwd set={'Yes' if settings.EMAIL_PASSWORD else 'No'}")
@@ -84,22 +86,12 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             )
     except Exception as e:
         logger.warning(f"Discovery scheduler failed to start: {str(e)}")
-    
-    yield
-
 
-   
-
-    # 💡 START LISTENERS HERE — inside lifespan
-    # print("🚀 Starting all event listeners...")
-    # tech_start()
-    # pricing_start()
-    # proposal_start()
-    # legal_start()
-    # human_start()
-    # print("✅ All listeners running in background.")
-    print("🚀 Starting main listener...")
-    main_listener()  # Start main listener
+    # 💡 START LISTENERS HERE — inside lifespan, all on this event loop
+    print("🚀 Starting listener supervisor...")
+    supervisor = ListenerSupervisor(get_event_bus())
+    register_listeners(supervisor)
+    await supervisor.start()
 
     yield   # App is running!
 
@@ -111,6 +103,17 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             await discovery_task
         except asyncio.CancelledError:
             logger.info("Discovery scheduler stopped")
+    if archiver_task:
+        archiver_task.cancel()
+
+    # Let RFPs already in the pipeline finish before the process exits
+    if supervisor:
+        await supervisor.stop(drain=True, timeout=settings.WORKFLOW_TIMEOUT)
+    await get_event_bus().close()
+
+    from app.services.prompt_builder import prompt_metrics
+    logger.info("LLM gateway stats: %s", get_gateway().stats())
+    logger.info("Prompt size stats: %s", prompt_metrics.stats())
     
     close_db()
 
@@ -4,7 +4,19 @@ from typing import List, Dict
 from datetime import datetime
 
 from pymongo import MongoClient
-import google.generativeai as genai
+
+from app.event_bus.mongo_bus import get_db
+from app.services.legal_review import ClauseVerdictStore, LegalReviewPipeline
+from app.services.llm_gateway import get_gateway
+from app.services.prompt_builder import PromptBuilder
+
+_LEGAL_REVIEW_PROMPT = """
+        Review the following RFP document for legal compliance and ensure all terms and conditions are met.
+        RFP Document: {rfp_doc}
+        """
+
+# sales_output fields holding contractual text, in review order
+_LEGAL_TEXT_FIELDS = ("rfp_raw_text", "terms_and_conditions", "special_conditions")
 
 
 class LegalAgent:
@@ -16,19 +28,52 @@ class LegalAgent:
 
     def __init__(
         self,
-        api_key: str,
+        api_key: str | None = None,
+        model: str = "gemini-pro",
+        cache_responses: bool = True,
+        clause_batch_size: int = 20,
+        clause_concurrency: int = 4,
+        prompt_budgets: Dict[str, int] | None = None,
     ):
         
-        genai.configure(api_key=api_key)
+        self.llm = get_gateway()
+        # Only used when no key is configured process-wide
+        self.llm.configure(api_key, override=False)
+        self.model = model
+        self.cache_responses = cache_responses
+        self.prompt_budgets = prompt_budgets or {}
+        self.clause_review = LegalReviewPipeline(
+            self.llm,
+            model,
+            ClauseVerdictStore(get_db()["legal_clause_verdicts"]),
+            batch_size=clause_batch_size,
+            concurrency=clause_concurrency,
+            prompt_budgets=self.prompt_budgets,
+        )
 
     # --------------------------------------------------
     # Legal Review
     # --------------------------------------------------
     def legal_review(self, rfp_doc) -> Dict | None:
-        model = genai.GenerativeModel("gemini-pro")
-        prompt = f"""
-        Review the following RFP document for legal compliance and ensure all terms and conditions are met.
-        RFP Document: {rfp_doc}
+        prompt = (
+            PromptBuilder("legal_review", _LEGAL_REVIEW_PROMPT, self.prompt_budgets)
+            .text("rfp_doc", str(rfp_doc), budget=6000)
+            .build()
+        )
+        return self.llm.generate_sync(prompt, model=self.model, cache=self.cache_responses)
+
+    async def review_rfp(self, sales_output: dict) -> Dict:
         """
-        response = model.generate_content(prompt)
-        return response.text.strip()
\ No newline at end of file
+        Clause-level compliance report for the RFP's contractual text (see
+        legal_review). Raises if none of the clauses could be reviewed.
+        Without any legal text the report has `no_legal_text` set and is
+        not compliant.
+        """
+        parts = [sales_output.get(f) for f in _LEGAL_TEXT_FIELDS if sales_output.get(f)]
+        if not parts:
+            parts = [sales_output.get("rfp_summary", "")]
+        report = await self.clause_review.review("\n\n".join(parts))
+
+        if report["clauses"] and len(report["unreviewed"]) == report["clauses"]:
+            raise RuntimeError(f"Legal review failed for all {report['clauses']} clauses")
+        return report
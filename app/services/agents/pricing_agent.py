@@ -6,6 +6,8 @@ from datetime import datetime
 from pymongo import MongoClient
 import google.generativeai as genai
 
+from app.services.pricing_engine import PriceBook, price_lines
+
 
 class PricingAgent:
     """
@@ -19,15 +21,57 @@ class PricingAgent:
         mongo_url: str,
         db_name: str = "asian_paints_db",
         product_collection: str = "products",
+        price_ttl: float = 600.0,
+        watch_prices: bool = False,
     ):
         
         self.client = MongoClient(mongo_url)
         self.db = self.client[db_name]
         self.products_col = self.db[product_collection]
 
+        self.price_book = PriceBook(self.products_col, ttl=price_ttl)
+        if watch_prices:
+            self.price_book.watch()
+
     # --------------------------------------------------
     # Product Search
     # --------------------------------------------------
     def find_product_by_sku(self, sku: str) -> Dict | None:
         product = self.products_col.find_one({"sku": sku})
-        return product
\ No newline at end of file
+        return product
+
+    # --------------------------------------------------
+    # Pricing
+    # --------------------------------------------------
+    def get_prices(self, technical_data: Dict[str, dict]) -> tuple[List[Dict], float]:
+        """
+        Prices every recommendation of every requirement (technical agent
+        `data`) with one price book lookup. Returns (lines, subtotal).
+
+        Per requirement, the best-ranked recommendation found in the price
+        book is marked `selected`; the others are alternatives, priced for
+        reference but left out of the subtotal.
+        """
+        lines = [
+            {
+                "requirement_id": req_id,
+                "sku": rec["sku"],
+                "name": rec.get("name"),
+                "score": rec.get("_score", 0.0),
+                "quantity": result.get("quantity"),
+            }
+            for req_id, result in technical_data.items()
+            for rec in result["recommendations"]
+            if rec.get("sku")
+        ]
+        book = self.price_book.get_many(line["sku"] for line in lines)
+
+        # Recommendations whose SKU is no longer in the catalog are dropped
+        lines = [line for line in lines if line["sku"] in book]
+        selected = set()
+        for line in lines:
+            line["name"] = line["name"] or book[line["sku"]].get("name")
+            line["price"] = book[line["sku"]].get("price")
+            line["selected"] = line["requirement_id"] not in selected
+            selected.add(line["requirement_id"])
+        return price_lines(lines, book)
@@ -1,5 +1,38 @@
-import google.generativeai as genai
-from typing import Dict, List
+import asyncio
+import textwrap
+
+from typing import AsyncIterator, Dict, List
+
+from app.services.llm_gateway import get_gateway
+from app.services.prompt_builder import PromptBuilder
+
+_EXECUTIVE_SUMMARY_PROMPT = """
+You are a senior FMCG proposal consultant.
+
+Write a concise executive summary (5–6 lines) for an RFP proposal.
+
+Rules:
+- Use ONLY the provided information
+- Do NOT invent prices, standards, or products
+- Keep a professional, business tone
+
+RFP Title:
+{rfp_title}
+
+RFP Summary:
+{rfp_summary}
+
+Recommended Products:
+{products}
+"""
+
+_SCOPE_PROMPT = """
+Rewrite the following RFP scope in a professional proposal tone.
+Do not add or remove information.
+
+RFP Scope:
+{rfp_summary}
+"""
 
 
 class ProposalAgent:
@@ -10,57 +43,125 @@ class ProposalAgent:
     - Produces a structured proposal (Markdown / HTML ready)
     """
 
-    def __init__(self, api_key: str, model: str = "gemini-1.5-pro"):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
+    def __init__(
+        self,
+        api_key: str | None = None,
+        model: str = "gemini-1.5-pro",
+        section_timeout: float = 60.0,
+        cache_responses: bool = True,
+        prompt_budgets: Dict[str, int] | None = None,
+    ):
+        self.llm = get_gateway()
+        # Only used when no key is configured process-wide
+        self.llm.configure(api_key, override=False)
+        self.model = model
+        self.section_timeout = section_timeout
+        # Same RFP inputs → same prompt; re-runs reuse the earlier text
+        self.cache_responses = cache_responses
+        # Overrides of the token budgets below, keyed "<prompt>.<field>"
+        self.prompt_budgets = prompt_budgets or {}
 
     # ---------------------------
     # Gemini helper
     # ---------------------------
     def _generate_text(self, prompt: str) -> str:
-        response = self.model.generate_content(prompt)
-        return response.text.strip()
+        return self.llm.generate_sync(prompt, model=self.model, cache=self.cache_responses)
+
+    async def _generate_text_async(self, prompt: str) -> str:
+        return await self.llm.generate(prompt, model=self.model, cache=self.cache_responses)
+
+    async def _stream_section(self, name: str, prompt: str, fallback: str, timeout: float | None = None) -> AsyncIterator[str]:
+        """
+        Yields a section's text as the model streams it. If the stream fails
+        or times out before any text arrived, yields the fallback instead;
+        a failure mid-stream keeps what was already sent.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.section_timeout)
+        sent = False
+        try:
+            chunks = self.llm.stream(prompt, model=self.model, cache=self.cache_responses).__aiter__()
+            while True:
+                try:
+                    text = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                if not sent:
+                    text = text.lstrip()
+                if text:
+                    sent = True
+                    yield text
+        except Exception as e:
+            print(f"⚠️ Proposal section '{name}' stream failed ({type(e).__name__}: {e})")
+            if not sent:
+                yield fallback
+
+    async def _generate_section(self, name: str, prompt: str, fallback: str, timeout: float | None = None) -> str:
+        """One narrative section; on timeout or error only this section falls back."""
+        try:
+            return await asyncio.wait_for(self._generate_text_async(prompt), timeout or self.section_timeout)
+        except Exception as e:
+            print(f"⚠️ Proposal section '{name}' failed ({type(e).__name__}: {e}), using fallback text")
+            return fallback
 
     # ---------------------------
     # Section builders
     # ---------------------------
 
-    def build_executive_summary(
+    def _executive_summary_prompt(
         self,
         rfp_title: str,
         rfp_summary: str,
         matched_products: List[Dict],
     ) -> str:
-        prompt = f"""
-You are a senior FMCG proposal consultant.
+        # Best-matching products first, so truncation drops the weakest
+        ranked = sorted(matched_products, key=lambda p: p.get("score", 0.0), reverse=True)
+        return (
+            PromptBuilder("executive_summary", _EXECUTIVE_SUMMARY_PROMPT, self.prompt_budgets)
+            .text("rfp_title", rfp_title, budget=64)
+            .text("rfp_summary", rfp_summary, budget=800)
+            .items("products", (p.get("name") for p in ranked), budget=200)
+            .build()
+        )
 
-Write a concise executive summary (5–6 lines) for an RFP proposal.
+    def _scope_prompt(self, rfp_summary: str) -> str:
+        return (
+            PromptBuilder("scope", _SCOPE_PROMPT, self.prompt_budgets)
+            .text("rfp_summary", rfp_summary, budget=1500)
+            .build()
+        )
 
-Rules:
-- Use ONLY the provided information
-- Do NOT invent prices, standards, or products
-- Keep a professional, business tone
+    def build_executive_summary(
+        self,
+        rfp_title: str,
+        rfp_summary: str,
+        matched_products: List[Dict],
+    ) -> str:
+        return self._generate_text(self._executive_summary_prompt(rfp_title, rfp_summary, matched_products))
 
-RFP Title:
-{rfp_title}
+    def build_scope_understanding(self, rfp_summary: str) -> str:
+        return self._generate_text(self._scope_prompt(rfp_summary))
 
-RFP Summary:
-{rfp_summary}
+    async def build_scope_understanding_async(self, rfp_summary: str) -> str:
+        return await self._generate_section(
+            "scope", self._scope_prompt(rfp_summary), self.fallback_scope(rfp_summary)
+        )
 
-Recommended Products:
-{', '.join([p['name'] for p in matched_products])}
-"""
-        return self._generate_text(prompt)
+    # ---------------------------
+    # Fallback narrative
+    # ---------------------------
 
-    def build_scope_understanding(self, rfp_summary: str) -> str:
-        prompt = f"""
-Rewrite the following RFP scope in a professional proposal tone.
-Do not add or remove information.
+    def fallback_executive_summary(self, rfp_title: str, matched_products: List[Dict]) -> str:
+        names = list(dict.fromkeys(p["name"] for p in matched_products if p.get("name")))
+        products = ", ".join(names) if names else "products from our catalogue"
+        return (
+            f"We are pleased to submit our proposal for {rfp_title}. "
+            f"Based on the stated requirements we recommend {products}. "
+            "The technical recommendation and assumptions below detail the proposed solution."
+        )
 
-RFP Scope:
-{rfp_summary}
-"""
-        return self._generate_text(prompt)
+    def fallback_scope(self, rfp_summary: str) -> str:
+        return textwrap.dedent(rfp_summary).strip()
 
     # ---------------------------
     # Deterministic tables
@@ -91,34 +192,20 @@ RFP Scope:
     # Final proposal
     # ---------------------------
 
-    def process_rfp(
-        self,
-        rfp_title: str,
-        rfp_summary: str,
-        matched_products: List[Dict],
-    ) -> Dict:
-        """
-        Returns proposal sections as structured output
-        """
+    # Markdown around the narrative sections; header + summary +
+    # scope_heading + scope + closing is the whole document
+    def _header(self, rfp_title: str) -> str:
+        return f"\n# Proposal Response – {rfp_title}\n\n## Executive Summary\n"
 
-        executive_summary = self.build_executive_summary(
-            rfp_title, rfp_summary, matched_products
-        )
-
-        scope = self.build_scope_understanding(rfp_summary)
+    def _scope_heading(self) -> str:
+        return "\n\n## Understanding of Scope\n"
 
+    def _closing(self, matched_products: List[Dict]) -> str:
         technical_table = self.build_technical_table(matched_products)
 
         assumptions = self.build_assumptions()
 
-        proposal_markdown = f"""
-# Proposal Response – {rfp_title}
-
-## Executive Summary
-{executive_summary}
-
-## Understanding of Scope
-{scope}
+        return f"""
 
 ## Technical Recommendation
 {technical_table}
@@ -127,8 +214,112 @@ RFP Scope:
 {assumptions}
 """
 
+    def _assemble(
+        self,
+        rfp_title: str,
+        executive_summary: str,
+        scope: str,
+        matched_products: List[Dict],
+    ) -> Dict:
+        proposal_markdown = (
+            self._header(rfp_title)
+            + executive_summary
+            + self._scope_heading()
+            + scope
+            + self._closing(matched_products)
+        )
+
         return {
             "title": rfp_title,
             "executive_summary": executive_summary,
             "proposal_markdown": proposal_markdown,
         }
+
+    async def process_rfp_async(
+        self,
+        rfp_title: str,
+        rfp_summary: str,
+        matched_products: List[Dict],
+        scope: str | None = None,
+    ) -> Dict:
+        """
+        Generates the independent narrative sections concurrently, so the
+        proposal takes as long as the slowest section. Each section has its
+        own timeout and falls back to deterministic text on its own.
+        """
+        sections = {
+            "executive_summary": self._generate_section(
+                "executive_summary",
+                self._executive_summary_prompt(rfp_title, rfp_summary, matched_products),
+                self.fallback_executive_summary(rfp_title, matched_products),
+            ),
+        }
+        if scope is None:
+            sections["scope"] = self.build_scope_understanding_async(rfp_summary)
+
+        results = dict(zip(sections, await asyncio.gather(*sections.values())))
+        return self._assemble(
+            rfp_title, results["executive_summary"], results.get("scope", scope), matched_products
+        )
+
+    def process_rfp(
+        self,
+        rfp_title: str,
+        rfp_summary: str,
+        matched_products: List[Dict],
+        scope: str | None = None,
+    ) -> Dict:
+        """
+        Returns proposal sections as structured output.
+        `scope` can be passed in when it was already rewritten upstream.
+        Blocking wrapper around `process_rfp_async` for code without an
+        event loop.
+        """
+        return asyncio.run(self.process_rfp_async(rfp_title, rfp_summary, matched_products, scope=scope))
+
+    async def stream_rfp(
+        self,
+        rfp_title: str,
+        rfp_summary: str,
+        matched_products: List[Dict],
+        scope: str | None = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Streams the proposal as {"section", "text"} chunks in document
+        order; concatenating every "text" gives `proposal_markdown`. The
+        executive summary streams token by token while the scope (if not
+        passed in) is generated alongside it. The last item is
+        {"section": "complete", "proposal": <same dict as process_rfp>}.
+        """
+        scope_task = None
+        if scope is None:
+            scope_task = asyncio.create_task(self.build_scope_understanding_async(rfp_summary))
+
+        try:
+            yield {"section": "header", "text": self._header(rfp_title)}
+
+            summary_parts = []
+            async for text in self._stream_section(
+                "executive_summary",
+                self._executive_summary_prompt(rfp_title, rfp_summary, matched_products),
+                self.fallback_executive_summary(rfp_title, matched_products),
+            ):
+                summary_parts.append(text)
+                yield {"section": "executive_summary", "text": text}
+            executive_summary = "".join(summary_parts)
+
+            yield {"section": "scope_heading", "text": self._scope_heading()}
+            if scope_task is not None:
+                scope = await scope_task
+            yield {"section": "scope", "text": scope}
+
+            yield {"section": "closing", "text": self._closing(matched_products)}
+        finally:
+            # Client went away mid-stream
+            if scope_task is not None and not scope_task.done():
+                scope_task.cancel()
+
+        yield {
+            "section": "complete",
+            "proposal": self._assemble(rfp_title, executive_summary, scope, matched_products),
+        }
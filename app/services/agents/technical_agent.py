@@ -1,10 +1,24 @@
 import json
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from datetime import datetime, timezone
 
 from pymongo import MongoClient
-import google.generativeai as genai
+from pymongo.errors import OperationFailure
+
+from app.services.ann_index import IVFIndex
+from app.services.catalog_embedder import CatalogEmbedder
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_codec import decode_matrix
+from app.services.lexical_index import BM25Index, fuse_scores
+from app.services.llm_gateway import get_gateway
+from app.services.vector_index import LocalVectorIndex
+
+# Provider limit for texts per batchEmbedContents request
+EMBED_BATCH_SIZE = 100
+SEARCH_CONCURRENCY = 8
+
 
 class TechnicalAgent:
     """
@@ -22,27 +36,67 @@ class TechnicalAgent:
         product_collection: str = "products",
         model_embedding: str = "models/text-embedding-004",
         api_key: str | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        vector_backend: str = "auto",
+        ann_index_path: str = "data/ann_index",
+        ann_nprobe: int = 8,
+        embedding_dtype: str = "float32",
+        search_mode: str = "hybrid",
+        lexical_candidates: int = 200,
+        fusion: str = "weighted",
+        fusion_alpha: float = 0.7,
     ):
 
         self.client = MongoClient(mongo_url)
         self.db = self.client[db_name]
         self.products_col = self.db[product_collection]
 
+        self.llm = get_gateway()
+        self.llm.configure(api_key, override=False)
         self.embedding_model = model_embedding
+        # How product embeddings are stored: "float32" list, or quantized
+        # "float16" / "int8" binary (see embedding_codec)
+        self.embedding_dtype = embedding_dtype
+        # Shared by requirement and product embeddings; keyed by (model, text)
+        self.embedding_cache = embedding_cache or EmbeddingCache(
+            self.db["embedding_cache"], model=model_embedding
+        )
+
+        # "atlas" = $vectorSearch, "local" = in-process exact index,
+        # "ann" = in-process IVF index persisted at ann_index_path,
+        # "auto" = Atlas, switching to local if $vectorSearch is unavailable
+        self.vector_backend = vector_backend
+        if embedding_dtype != "float32" and vector_backend in ("atlas", "auto"):
+            # $vectorSearch cannot read quantized binary embeddings and just
+            # matches nothing, so the "auto" fallback would never trigger
+            if vector_backend == "atlas":
+                raise ValueError(f"Atlas vector search needs float32 embeddings, not {embedding_dtype}")
+            print(f"⚠️ Embeddings stored as {embedding_dtype}, using local vector index instead of Atlas")
+            self.vector_backend = "local"
+        self.local_index = LocalVectorIndex(self.products_col)
+        self.ann_index = IVFIndex(ann_index_path, nprobe=ann_nprobe)
+        self._ann_ready = False
+
+        # "vector" = vector search over the whole catalog; "hybrid" = BM25
+        # keyword prefilter to `lexical_candidates`, reranked by vector
+        # score and fused ("weighted" with fusion_alpha, or "rrf")
+        self.search_mode = search_mode
+        self.lexical_index = BM25Index(self.products_col)
+        self.lexical_candidates = lexical_candidates
+        self.fusion = fusion
+        self.fusion_alpha = fusion_alpha
 
     # --------------------------------------------------
     # Embedding
     # --------------------------------------------------
     def generate_embedding(self, content: str) -> List[float] | None:
+        return self.generate_embeddings([content])[0]
+
+    def _embed_one(self, content: str) -> List[float] | None:
 
         # print("API KEY", genai.api_key)
         try:
-            resp = genai.embed_content(
-                model=self.embedding_model,
-                content=content,
-                request_options={"timeout": 120},
-            )
-            return resp["embedding"]
+            return self.llm.embed(content, model=self.embedding_model, timeout=120)
         except requests.exceptions.ReadTimeout as e:
             print("⏱️ Embedding timeout:", e)
             return None
@@ -50,35 +104,76 @@ class TechnicalAgent:
             print("❌ Embedding error:", e)
             return None
 
-    # --------------------------------------------------
-    # Product Embedding Bootstrap (run once)
-    # --------------------------------------------------
-    def ensure_product_embeddings(self) -> int:
+    def generate_embeddings(self, contents: List[str]) -> List[List[float] | None]:
         """
-        Ensures all products have embeddings.
-        Returns number of products updated.
+        Embeds many texts with one request per EMBED_BATCH_SIZE chunk.
+        Result order matches `contents`. Cached texts are served from the
+        embedding cache; only the rest (deduplicated) go to the provider.
+        If a whole chunk fails, its texts are retried one by one so a single
+        bad item only loses itself.
         """
-        updated = 0
-        products = list(self.products_col.find({}))
+        try:
+            cached = self.embedding_cache.get_many(contents)
+        except Exception as e:
+            print("⚠️ Embedding cache unavailable:", e)
+            cached = {}
+        todo = list(dict.fromkeys(c for c in contents if c not in cached))
+        fresh = self._embed_uncached(todo)
 
-        for product in products:
-            if product.get("embedding"):
-                continue
+        try:
+            self.embedding_cache.put_many({c: e for c, e in zip(todo, fresh) if e is not None})
+        except Exception as e:
+            print("⚠️ Embedding cache write failed:", e)
+        found = {**cached, **{c: e for c, e in zip(todo, fresh)}}
+        return [found.get(c) for c in contents]
 
-            desc = product.get("description", "")
-            if not desc:
-                continue
+    def _embed_uncached(self, contents: List[str]) -> List[List[float] | None]:
+        embeddings: List[List[float] | None] = [None] * len(contents)
 
-            emb = self.generate_embedding(desc)
-            if emb is None:
-                continue
+        for start in range(0, len(contents), EMBED_BATCH_SIZE):
+            chunk = contents[start:start + EMBED_BATCH_SIZE]
+            try:
+                embeddings[start:start + len(chunk)] = self.llm.embed(
+                    chunk, model=self.embedding_model, timeout=120
+                )
+            except Exception as e:
+                print(f"❌ Batch embedding error ({len(chunk)} texts), retrying individually:", e)
+                for i, content in enumerate(chunk):
+                    embeddings[start + i] = self._embed_one(content)
 
-            self.products_col.update_one(
-                {"_id": product["_id"]},
-                {"$set": {"embedding": emb}},
-            )
-            updated += 1
+        return embeddings
 
+    # --------------------------------------------------
+    # Product Embedding Bootstrap
+    # --------------------------------------------------
+    def ensure_product_embeddings(
+        self,
+        restart: bool = False,
+        progress: bool = False,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        full: bool = False,
+    ) -> int:
+        """
+        Embeds products whose embedding is missing, from another model or
+        older than their description (streaming, resumable; see
+        catalog_embedder). New vectors are appended to the saved ANN index,
+        if there is one. Returns number of products updated.
+        """
+        # Load the index even if this process never searched it; otherwise
+        # workers mapping the saved index would not see these products
+        if self.vector_backend == "ann" or self.ann_index.exists():
+            self._ensure_ann_index()
+
+        def on_embedded(keys, vectors):
+            if self._ann_ready:
+                self.ann_index.add(vectors, keys)
+
+        embedder = CatalogEmbedder(self, batch_size=batch_size, concurrency=concurrency)
+        updated = embedder.run(restart=restart, progress=progress, on_embedded=on_embedded, full=full)
+        if updated:
+            self.local_index.mark_stale()
+            self.lexical_index.mark_stale()
         return updated
 
     # --------------------------------------------------
@@ -89,19 +184,201 @@ class TechnicalAgent:
         query_embedding: List[float],
         top_k: int = 3,
     ) -> List[Dict]:
-        if not query_embedding:
+        return self.search_products_batch([query_embedding], top_k)[0]
+
+    def search_products_batch(
+        self,
+        query_embeddings: List[List[float] | None],
+        top_k: int = 3,
+        query_texts: List[str] | None = None,
+    ) -> List[List[Dict]]:
+        """
+        Top-k products per query. In hybrid mode (given `query_texts`) the
+        vector stage only scores keyword candidates; queries without any
+        keyword match fall back to plain vector search.
+        """
+        if self.search_mode == "hybrid" and query_texts is not None:
+            return self._hybrid_search_batch(query_embeddings, query_texts, top_k)
+        return self._vector_search_batch(query_embeddings, top_k)
+
+    def _vector_search_batch(
+        self,
+        query_embeddings: List[List[float] | None],
+        top_k: int = 3,
+    ) -> List[List[Dict]]:
+        """
+        The local backend answers the whole batch with one matrix product;
+        Atlas queries run concurrently.
+        """
+        if self.vector_backend == "local":
+            return self.local_index.search_batch(query_embeddings, top_k)
+        if self.vector_backend == "ann":
+            return self._ann_search_batch(query_embeddings, top_k)
+
+        def safe_search(embedding):
+            try:
+                return self._atlas_search(embedding, top_k)
+            except OperationFailure:
+                raise
+            except Exception as e:
+                print("❌ Vector search error:", e)
+                return []
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(SEARCH_CONCURRENCY, len(query_embeddings)))) as pool:
+                return list(pool.map(safe_search, query_embeddings))
+        except OperationFailure as e:
+            if self.vector_backend != "auto":
+                raise
+            print("⚠️ $vectorSearch unavailable, switching to local vector index:", e)
+            self.vector_backend = "local"
+            return self.local_index.search_batch(query_embeddings, top_k)
+
+    # --------------------------------------------------
+    # Hybrid (keyword prefilter + vector rerank)
+    # --------------------------------------------------
+    def _candidate_vector_scores(
+        self,
+        query_embeddings: List[List[float] | None],
+        candidates: List[List[str]],
+    ) -> List[Dict[str, float]]:
+        """{sku: vector score} per query, for its candidates only."""
+        if self.vector_backend == "local":
+            return self.local_index.score_candidates(query_embeddings, candidates)
+
+        if self.vector_backend == "ann":
+            self._ensure_ann_index()
+            if self._ann_ready:
+                return [
+                    {sku: (1.0 + cos) / 2.0 for sku, cos in self.ann_index.score_keys(q, c).items()}
+                    for q, c in zip(query_embeddings, candidates)
+                ]
+
+        # Atlas: $vectorSearch restricted to each query's candidates, so no
+        # stored embeddings leave the server
+        def safe_scores(query, skus):
+            if query is None or not len(query) or not skus:
+                return {}
+            try:
+                return {d["sku"]: d["_score"] for d in self._atlas_search(query, len(skus), skus=skus)}
+            except OperationFailure:
+                raise
+            except Exception as e:
+                print("❌ Vector rerank error:", e)
+                return {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(SEARCH_CONCURRENCY, len(candidates)))) as pool:
+                return list(pool.map(safe_scores, query_embeddings, candidates))
+        except OperationFailure as e:
+            if self.vector_backend != "auto":
+                raise
+            print("⚠️ $vectorSearch unavailable, switching to local vector index:", e)
+            self.vector_backend = "local"
+            return self.local_index.score_candidates(query_embeddings, candidates)
+
+    def _hybrid_search_batch(
+        self,
+        query_embeddings: List[List[float] | None],
+        query_texts: List[str],
+        top_k: int = 3,
+    ) -> List[List[Dict]]:
+        lexical = self.lexical_index.search_batch(query_texts, self.lexical_candidates)
+        vector = self._candidate_vector_scores(query_embeddings, [[sku for sku, _ in c] for c in lexical])
+
+        # A query whose embedding failed is ranked on its keyword matches alone
+        fused = [
+            fuse_scores(c, v if q is not None and len(q) else None, method=self.fusion, alpha=self.fusion_alpha)[:top_k]
+            for c, v, q in zip(lexical, vector, query_embeddings)
+        ]
+
+        skus = {f[0] for result in fused for f in result}
+        details = {
+            p["sku"]: p for p in self.products_col.find(
+                {"sku": {"$in": list(skus)}}, {"_id": 0, "sku": 1, "name": 1, "description": 1}
+            )
+        } if skus else {}
+        results = [
+            [
+                {**details[sku], "_score": score, "_vector_score": vec, "_lexical_score": lex}
+                for sku, score, vec, lex in result if sku in details
+            ]
+            for result in fused
+        ]
+
+        # No keyword overlap: plain vector search for those queries
+        fallback = [i for i, r in enumerate(results) if not r and query_embeddings[i]]
+        if fallback:
+            for i, matches in zip(fallback, self._vector_search_batch([query_embeddings[i] for i in fallback], top_k)):
+                results[i] = matches
+        return results
+
+    def _ensure_ann_index(self):
+        if self._ann_ready:
+            return
+        if self.ann_index.exists():
+            self.ann_index.load()
+        else:
+            keys, vectors = [], []
+            for doc in self.products_col.find(
+                {"sku": {"$exists": True, "$ne": None}, "embedding": {"$exists": True, "$ne": None}},
+                {"sku": 1, "embedding": 1},
+            ):
+                keys.append(doc["sku"])
+                vectors.append(doc["embedding"])
+            if not keys:
+                return
+            self.ann_index.build(decode_matrix(vectors), keys)
+        self._ann_ready = True
+
+    def _ann_search_batch(
+        self,
+        query_embeddings: List[List[float] | None],
+        top_k: int = 3,
+    ) -> List[List[Dict]]:
+        self._ensure_ann_index()
+        if not self._ann_ready:
+            return [[] for _ in query_embeddings]
+
+        hits = self.ann_index.search_batch(query_embeddings, top_k)
+
+        # One query for the product details of every hit in the batch
+        skus = {sku for result in hits for sku, _ in result}
+        details = {
+            p["sku"]: p for p in self.products_col.find(
+                {"sku": {"$in": list(skus)}}, {"_id": 0, "sku": 1, "name": 1, "description": 1}
+            )
+        }
+        return [
+            [{**details[sku], "_score": (1.0 + cos) / 2.0} for sku, cos in result if sku in details]
+            for result in hits
+        ]
+
+    def _atlas_search(
+        self,
+        query_embedding: List[float],
+        top_k: int = 3,
+        skus: List[str] | None = None,
+    ) -> List[Dict]:
+        """
+        Top-k by $vectorSearch; with `skus`, only those products are
+        considered (needs `sku` declared as a filter field in the index).
+        """
+        if query_embedding is None or not len(query_embedding):
             return []
 
+        search = {
+            "index": "default",
+            "queryVector": list(map(float, query_embedding)),
+            "path": "embedding",
+            "numCandidates": 50,
+            "limit": top_k,
+        }
+        if skus is not None:
+            search["filter"] = {"sku": {"$in": list(skus)}}
+            search["numCandidates"] = min(max(50, 2 * len(skus)), 10000)
         pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "default",
-                    "queryVector": query_embedding,
-                    "path": "embedding",
-                    "numCandidates": 50,
-                    "limit": top_k,
-                }
-            },
+            {"$vectorSearch": search},
             {
                 "$project": {
                     "_id": 0,
@@ -125,14 +402,15 @@ class TechnicalAgent:
 
         missing_requirements = []
 
-        for req in requirements:
+        print("Processing requirements:", [req["requirement_id"] for req in requirements])
+        embeddings = self.generate_embeddings([req["requirement_text"] for req in requirements])
+        print("Generated embeddings:", sum(e is not None for e in embeddings), "/", len(requirements))
 
-            print("Processing requirement:", req["requirement_id"], "\n Requirement text:", req["requirement_text"])
-            embedding = self.generate_embedding(req["requirement_text"])
-            print("Generate embedding output:", embedding)
+        all_matches = self.search_products_batch(
+            embeddings, query_texts=[req["requirement_text"] for req in requirements]
+        )
 
-            print("Generated embedding for requirement:", req["requirement_id"])
-            matches = self.search_products(embedding)
+        for req, matches in zip(requirements, all_matches):
 
             if not matches:
                 missing_requirements.append(req["requirement_id"])
@@ -0,0 +1,317 @@
+"""
+IVF approximate nearest-neighbour index with memory-mapped storage.
+
+Vectors are clustered around `nlist` spherical k-means centroids; a query
+scans only the `nprobe` closest clusters. Storage is a directory of
+append-only files, so workers map an existing index at startup instead of
+rebuilding it, and new products are appended without retraining:
+
+    meta.json       dim, nlist
+    centroids.npy   (nlist, dim) float32
+    vectors.f32     (n, dim) float32 unit rows, memory-mapped
+    lists.i32       cluster id per row
+    keys.txt        product key (sku) per row
+    tombstones.txt  rows superseded by a later insert of the same key
+
+Benchmark recall against exact search:
+
+    python -m app.services.ann_index --benchmark --queries 200 --k 3
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.vector_index import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+_ASSIGN_CHUNK = 65536
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by cosine) for each row, in chunks to bound memory."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        block = vectors[start:start + _ASSIGN_CHUNK]
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit vectors."""
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=nlist)
+
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters on random points so every list is used
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+
+    def __init__(self, path: str, nprobe: int = 8):
+        self.path = path
+        self.nprobe = nprobe
+
+        self.dim = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.keys: List[str] = []
+        self._lists: List[np.ndarray] = []
+        self._deleted: set = set()
+        self._key_row: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # Files
+    # --------------------------------------------------
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file("meta.json"))
+
+    @property
+    def size(self) -> int:
+        return len(self.keys) - len(self._deleted)
+
+    def build(self, vectors: np.ndarray, keys: Sequence[str], nlist: Optional[int] = None, train_sample: int = 100000):
+        """Trains centroids on (a sample of) `vectors` and writes a fresh index."""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        nlist = nlist or max(1, int(4 * np.sqrt(len(vectors))))
+
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > train_sample:
+            sample = vectors[rng.choice(len(vectors), train_sample, replace=False)]
+        centroids = train_centroids(sample, nlist)
+
+        os.makedirs(self.path, exist_ok=True)
+        for name in ("vectors.f32", "lists.i32", "keys.txt", "tombstones.txt"):
+            if os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+        np.save(self._file("centroids.npy"), centroids)
+        with open(self._file("meta.json"), "w") as f:
+            json.dump({"dim": int(vectors.shape[1]), "nlist": int(len(centroids))}, f)
+
+        self.load()
+        self.add(vectors, keys)
+        logger.info("Built IVF index: %d vectors, %d lists", len(keys), len(centroids))
+
+    def load(self):
+        """Maps an existing index. Rows beyond the shortest file (torn append) are ignored."""
+        with open(self._file("meta.json")) as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.centroids = np.load(self._file("centroids.npy"))
+
+        keys = []
+        if os.path.exists(self._file("keys.txt")):
+            with open(self._file("keys.txt"), encoding="utf-8") as f:
+                keys = [line.rstrip("\n") for line in f]
+
+        vec_rows = os.path.getsize(self._file("vectors.f32")) // (4 * self.dim) if os.path.exists(self._file("vectors.f32")) else 0
+        assign = np.fromfile(self._file("lists.i32"), dtype=np.int32) if os.path.exists(self._file("lists.i32")) else np.zeros(0, np.int32)
+        count = min(len(keys), vec_rows, len(assign))
+
+        deleted = set()
+        if os.path.exists(self._file("tombstones.txt")):
+            with open(self._file("tombstones.txt")) as f:
+                deleted = {int(line) for line in f if line.strip() and int(line) < count}
+
+        with self._lock:
+            self.keys = keys[:count]
+            self.vectors = self._map(count)
+            self._deleted = deleted
+            self._key_row = {k: i for i, k in enumerate(self.keys) if i not in deleted}
+            self._lists = self._group(assign[:count], len(self.centroids))
+
+    def _map(self, count: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    @staticmethod
+    def _group(assign: np.ndarray, nlist: int, offset: int = 0) -> List[np.ndarray]:
+        order = np.argsort(assign, kind="stable").astype(np.int64) + offset
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+        return [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+
+    # --------------------------------------------------
+    # Inserts
+    # --------------------------------------------------
+    def add(self, vectors: np.ndarray, keys: Sequence[str]):
+        """
+        Appends vectors without retraining. Re-inserting an existing key
+        tombstones its previous row.
+        """
+        if len(keys) == 0:
+            return
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        assign = _assign(vectors, self.centroids)
+
+        with self._lock:
+            start = len(self.keys)
+            superseded = [self._key_row[k] for k in keys if k in self._key_row]
+
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            with open(self._file("lists.i32"), "ab") as f:
+                f.write(assign.astype(np.int32).tobytes())
+            with open(self._file("keys.txt"), "a", encoding="utf-8") as f:
+                f.writelines(f"{k}\n" for k in keys)
+            if superseded:
+                with open(self._file("tombstones.txt"), "a") as f:
+                    f.writelines(f"{row}\n" for row in superseded)
+
+            self.keys.extend(keys)
+            self._deleted.update(superseded)
+            for i, k in enumerate(keys):
+                self._key_row[k] = start + i
+            new_lists = self._group(assign, len(self.centroids), offset=start)
+            self._lists = [np.concatenate([old, new]) for old, new in zip(self._lists, new_lists)]
+            self.vectors = self._map(len(self.keys))
+
+    # --------------------------------------------------
+    # Search
+    # --------------------------------------------------
+    def search_batch(self, queries: Sequence[Sequence[float]], top_k: int = 3, nprobe: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """(key, cosine) pairs, best first, for each query. Empty queries get []."""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        with self._lock:
+            vectors, keys, lists, deleted = self.vectors, self.keys, self._lists, self._deleted
+
+        results: List[List[Tuple[str, float]]] = [[] for _ in queries]
+        valid = [i for i, q in enumerate(queries) if q is not None and len(q)]
+        if not valid or len(keys) == 0:
+            return results
+
+        q = normalize_rows(np.asarray([queries[i] for i in valid], dtype=np.float32))
+        csims = q @ self.centroids.T
+        probes = np.argpartition(-csims, nprobe - 1, axis=1)[:, :nprobe]
+
+        for row, i in enumerate(valid):
+            rows = np.concatenate([lists[c] for c in probes[row]])
+            if deleted:
+                rows = rows[~np.isin(rows, list(deleted))]
+            if len(rows) == 0:
+                continue
+            sims = vectors[rows] @ q[row]
+            k = min(top_k, len(rows))
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+            results[i] = [(keys[rows[j]], float(sims[j])) for j in top]
+        return results
+
+
+    def score_keys(self, query: Sequence[float], keys: Sequence[str]) -> Dict[str, float]:
+        """Exact cosine of `query` against the given keys only."""
+        with self._lock:
+            vectors, key_row = self.vectors, self._key_row
+        keys = [k for k in keys if k in key_row]
+        if query is None or not len(query) or not keys:
+            return {}
+        q = normalize_rows(np.asarray([query], dtype=np.float32))[0]
+        sims = vectors[[key_row[k] for k in keys]] @ q
+        return {k: float(c) for k, c in zip(keys, sims)}
+
+
+# --------------------------------------------------
+# Benchmark
+# --------------------------------------------------
+def exact_top_k(vectors: np.ndarray, keys: Sequence[str], queries: np.ndarray, k: int) -> List[List[str]]:
+    matrix = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    sims = normalize_rows(np.asarray(queries, dtype=np.float32)) @ matrix.T
+    top = np.argsort(-sims, axis=1)[:, :k]
+    return [[keys[j] for j in row] for row in top]
+
+
+def recall_at_k(index: IVFIndex, vectors: np.ndarray, keys: Sequence[str], queries: np.ndarray, k: int, nprobe: int) -> Dict[str, float]:
+    """Recall@k of the index against exact search, plus ANN query throughput."""
+    truth = exact_top_k(vectors, keys, queries, k)
+
+    started = time.perf_counter()
+    found = index.search_batch(list(queries), k, nprobe=nprobe)
+    elapsed = time.perf_counter() - started
+
+    hits = sum(len(set(t) & {key for key, _ in f}) for t, f in zip(truth, found))
+    return {
+        "nprobe": nprobe,
+        "k": k,
+        "recall": hits / (k * len(queries)),
+        "qps": len(queries) / elapsed if elapsed else float("inf"),
+    }
+
+
+def main():
+    from pymongo import MongoClient
+
+    from app.config.settings import settings
+    from app.services.embedding_codec import decode_matrix
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the product IVF index")
+    parser.add_argument("--mongo", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="rfp")
+    parser.add_argument("--path", default=settings.ANN_INDEX_PATH)
+    parser.add_argument("--build", action="store_true", help="rebuild the index from the products collection")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--queries", type=int, default=200, help="catalog vectors held out as queries")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    products = MongoClient(args.mongo)[args.db]["products"]
+    keys, vectors = [], []
+    for doc in products.find(
+        {"sku": {"$exists": True, "$ne": None}, "embedding": {"$exists": True, "$ne": None}}, {"sku": 1, "embedding": 1}
+    ):
+        keys.append(doc["sku"])
+        vectors.append(doc["embedding"])
+    vectors = decode_matrix(vectors)
+    print(f"{len(keys)} embedded products")
+
+    index = IVFIndex(args.path)
+    if args.build or not index.exists():
+        index.build(vectors, keys)
+    else:
+        index.load()
+
+    if args.benchmark and len(keys) > 1:
+        # Queries are held out of a scratch index built from the remaining
+        # products; a query that is itself indexed would always find itself
+        rng = np.random.default_rng(0)
+        held_out = rng.choice(len(vectors), min(args.queries, len(vectors) // 2), replace=False)
+        rest = np.setdiff1d(np.arange(len(vectors)), held_out)
+        rest_keys = [keys[i] for i in rest]
+        scratch = tempfile.mkdtemp(prefix="ann_benchmark_")
+        try:
+            bench = IVFIndex(scratch)
+            bench.build(vectors[rest], rest_keys)
+            for nprobe in args.nprobe:
+                r = recall_at_k(bench, vectors[rest], rest_keys, vectors[held_out], args.k, nprobe)
+                print(f"nprobe={r['nprobe']:>3}  recall@{r['k']}={r['recall']:.3f}  {r['qps']:.0f} q/s")
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Streaming, resumable product embedding job.
+
+A product is (re-)embedded when its embedding is missing, was produced by
+another model, or its description changed since (`description_hash`).
+By default only products Mongo can already tell are stale are visited:
+no `embedded` flag, another `embedding_model`, or no `description_hash`
+(each backed by an index). A description edited in place keeps its old
+hash, so after such edits run with `--full`, which scans the whole
+catalog and compares hashes. Neither cursor projects the embeddings
+themselves.
+
+Descriptions are embedded in a bounded number of
+concurrent batches and written back with one `bulk_write` per window; the
+last `_id` of each flushed window is checkpointed in `embedding_jobs`, so
+an interrupted run resumes where it stopped.
+
+    python -m app.services.catalog_embedder [--restart] [--full]
+"""
+import argparse
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from tqdm import tqdm
+
+from app.services.embedding_codec import encode_embedding
+
+logger = logging.getLogger(__name__)
+
+_PROJECTION = {
+    "_id": 1, "sku": 1, "description": 1, "description_hash": 1, "embedding_model": 1,
+    # Whether a vector is stored, without transferring it
+    "has_embedding": {"$gt": ["$embedding", None]},
+}
+
+
+def description_hash(description: str) -> str:
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+class CatalogEmbedder:
+
+    def __init__(
+        self,
+        agent,
+        job_id: str = "catalog",
+        batch_size: int = 100,
+        concurrency: int = 4,
+    ):
+        self.agent = agent
+        self.products_col = agent.products_col
+        self.jobs_col = agent.db["embedding_jobs"]
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.concurrency = max(concurrency, 1)
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        if self._indexed:
+            return
+        for field in ("embedded", "embedding_model", "description_hash"):
+            self.products_col.create_index([(field, ASCENDING)], name=field)
+        # Products embedded before the flag existed
+        self.products_col.update_many(
+            {"embedded": {"$exists": False}, "embedding": {"$ne": None}},
+            {"$set": {"embedded": True}},
+        )
+        self._indexed = True
+
+    def _query(self, full: bool) -> dict:
+        query = {"description": {"$nin": [None, ""]}}
+        if not full:
+            query["$or"] = [
+                {"embedded": {"$ne": True}},
+                {"embedding_model": {"$ne": self.agent.embedding_model}},
+                {"description_hash": None},
+            ]
+        return query
+
+    # --------------------------------------------------
+    # Checkpoint
+    # --------------------------------------------------
+    def _load_checkpoint(self) -> Optional[dict]:
+        job = self.jobs_col.find_one({"_id": self.job_id})
+        if not job or job.get("status") != "running" or job.get("model") != self.agent.embedding_model:
+            return None
+        return job
+
+    def _save_checkpoint(self, last_id, processed: int, updated: int, status: str = "running"):
+        self.jobs_col.update_one(
+            {"_id": self.job_id},
+            {
+                "$set": {
+                    "status": status,
+                    "model": self.agent.embedding_model,
+                    "last_id": last_id,
+                    "processed": processed,
+                    "updated": updated,
+                    "updated_at": datetime.utcnow(),
+                },
+                "$setOnInsert": {"started_at": datetime.utcnow()},
+            },
+            upsert=True,
+        )
+
+    # --------------------------------------------------
+    # Run
+    # --------------------------------------------------
+    def _needs_embedding(self, product: dict) -> bool:
+        return (
+            not product.get("has_embedding")
+            or product.get("embedding_model") != self.agent.embedding_model
+            or product.get("description_hash") != description_hash(product["description"])
+        )
+
+    def _flush(self, pending: List[dict], on_embedded) -> int:
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+            embedded = list(pool.map(
+                lambda batch: self.agent.generate_embeddings([p["description"] for p in batch]),
+                batches,
+            ))
+
+        ops, keys, vectors = [], [], []
+        for batch, embeddings in zip(batches, embedded):
+            for product, emb in zip(batch, embeddings):
+                if emb is None:
+                    continue
+                ops.append(UpdateOne(
+                    {"_id": product["_id"]},
+                    {"$set": {
+                        "embedding": encode_embedding(emb, self.agent.embedding_dtype),
+                        "embedded": True,
+                        "embedding_model": self.agent.embedding_model,
+                        "description_hash": description_hash(product["description"]),
+                    }},
+                ))
+                if product.get("sku"):
+                    keys.append(product["sku"])
+                    vectors.append(emb)
+
+        if ops:
+            self.products_col.bulk_write(ops, ordered=False)
+        if on_embedded and keys:
+            on_embedded(keys, vectors)
+        return len(ops)
+
+    def run(
+        self,
+        restart: bool = False,
+        progress: bool = False,
+        on_embedded: Optional[Callable[[List[str], List[List[float]]], None]] = None,
+        full: bool = False,
+    ) -> int:
+        """
+        Embeds every product that needs it and returns how many were
+        updated. `on_embedded(skus, vectors)` is called after each flush.
+        `full` scans the whole catalog instead of only flagged products.
+        """
+        self._ensure_indexes()
+        checkpoint = None if restart else self._load_checkpoint()
+        query = self._query(full)
+        if checkpoint and checkpoint.get("last_id") is not None:
+            query["_id"] = {"$gt": checkpoint["last_id"]}
+            logger.info("Resuming embedding job %s after %s", self.job_id, checkpoint["last_id"])
+
+        processed = checkpoint.get("processed", 0) if checkpoint else 0
+        updated = checkpoint.get("updated", 0) if checkpoint else 0
+        window = self.batch_size * self.concurrency
+
+        bar = tqdm(
+            total=self.products_col.count_documents(query),
+            disable=not progress,
+            desc="Embedding products",
+            unit="product",
+        )
+        cursor = self.products_col.find(query, _PROJECTION).sort("_id", ASCENDING).batch_size(window)
+
+        pending: List[dict] = []
+        scanned = 0
+        last_id = None
+        for product in cursor:
+            scanned += 1
+            last_id = product["_id"]
+            if self._needs_embedding(product):
+                pending.append(product)
+            if len(pending) >= window:
+                updated += self._flush(pending, on_embedded)
+                processed += scanned
+                self._save_checkpoint(last_id, processed, updated)
+                bar.update(scanned)
+                bar.set_postfix(updated=updated)
+                pending, scanned = [], 0
+
+        if pending:
+            updated += self._flush(pending, on_embedded)
+        processed += scanned
+        bar.update(scanned)
+        bar.close()
+
+        # A finished run leaves no resume point; the next run starts over
+        # and only touches products whose hash or model changed
+        self._save_checkpoint(None, processed, updated, status="completed")
+        logger.info("Embedding job %s done: %d scanned, %d embedded", self.job_id, processed, updated)
+        return updated
+
+
+def main():
+    from app.config.settings import settings
+    from app.services.agents.technical_agent import TechnicalAgent
+
+    parser = argparse.ArgumentParser(description="Embed new and changed products")
+    parser.add_argument("--mongo", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="rfp")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--restart", action="store_true", help="ignore the saved resume point")
+    parser.add_argument("--full", action="store_true", help="scan the whole catalog for edited descriptions")
+    args = parser.parse_args()
+
+    agent = TechnicalAgent(
+        mongo_url=args.mongo,
+        db_name=args.db,
+        vector_backend=settings.VECTOR_SEARCH_BACKEND,
+        ann_index_path=settings.ANN_INDEX_PATH,
+        ann_nprobe=settings.ANN_NPROBE,
+        embedding_dtype=settings.EMBEDDING_STORAGE_DTYPE,
+    )
+    updated = agent.ensure_product_embeddings(
+        restart=args.restart,
+        progress=True,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        full=args.full,
+    )
+    print(f"Embedded {updated} products")
+
+
+if __name__ == "__main__":
+    main()
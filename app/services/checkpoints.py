@@ -0,0 +1,87 @@
+"""Stage checkpoints so a restarted workflow skips work it already did"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from app.event_bus.mongo_bus import get_db
+
+logger = logging.getLogger(__name__)
+
+# RFP fields that change while the workflow runs and must not affect hashes
+_VOLATILE_RFP_FIELDS = {"_id", "status", "updated_at", "errors", "human_decision"}
+
+
+def rfp_fingerprint_input(rfp_doc: dict) -> Any:
+    """The part of the RFP document stage outputs depend on."""
+    if "sales_output" in rfp_doc:
+        return rfp_doc["sales_output"]
+    return {k: v for k, v in rfp_doc.items() if k not in _VOLATILE_RFP_FIELDS}
+
+
+def stage_fingerprint(
+    stage: str,
+    rfp_doc: dict,
+    upstream: Dict[str, str],
+    version: str = "1",
+    external: Any = None,
+) -> str:
+    """
+    Hash of everything a stage's output depends on: the stage (and its code
+    version), the RFP input and the fingerprints of its upstream stages.
+    Chaining fingerprints rather than hashing upstream outputs keeps the
+    hash stable across a Mongo round trip of those outputs. `external` is
+    data the stage reads from outside the workflow (e.g. current prices).
+    """
+    material = {
+        "stage": stage,
+        "version": version,
+        "rfp": rfp_fingerprint_input(rfp_doc),
+        "upstream": upstream,
+    }
+    if external is not None:
+        material["external"] = external
+    encoded = json.dumps(material, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Stage checkpoints kept on the RFP's `workflows` document under
+    `checkpoints.<stage>`: status, input_hash, output and completed_at.
+    """
+
+    def __init__(self, max_age: Optional[timedelta] = None):
+        self.col = get_db()["workflows"]
+        self.max_age = max_age
+
+    def load(self, rfp_id) -> Dict[str, dict]:
+        doc = self.col.find_one({"rfp_id": rfp_id}, {"checkpoints": 1})
+        return (doc or {}).get("checkpoints", {})
+
+    def save(self, rfp_id, stage: str, input_hash: str, output: Any):
+        self.col.update_one(
+            {"rfp_id": rfp_id},
+            {
+                "$set": {
+                    f"checkpoints.{stage}": {
+                        "status": "completed",
+                        "input_hash": input_hash,
+                        "output": output,
+                        "completed_at": datetime.utcnow(),
+                    }
+                },
+                "$setOnInsert": {"created_at": datetime.utcnow()},
+            },
+            upsert=True,
+        )
+
+    def is_fresh(self, checkpoint: Optional[dict], input_hash: str) -> bool:
+        if not checkpoint or checkpoint.get("status") != "completed":
+            return False
+        if checkpoint.get("input_hash") != input_hash:
+            return False
+        if self.max_age is not None and datetime.utcnow() - checkpoint["completed_at"] > self.max_age:
+            return False
+        return True
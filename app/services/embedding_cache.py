@@ -0,0 +1,179 @@
+"""Content-addressed embedding cache: in-process LRU in front of MongoDB"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+_META_ID = "__meta__"
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of embeddings keyed by hash(model, text).
+
+    Lookups hit an in-process LRU first, then the Mongo collection (one
+    `$in` query per batch). The Mongo tier is trimmed back to
+    `max_persistent_items` by least-recent use. When the active model
+    differs from the one recorded in the collection, entries of other models
+    are dropped: they can never hit again and only take space.
+    """
+
+    def __init__(
+        self,
+        collection,
+        model: str,
+        max_memory_items: int = 10000,
+        max_persistent_items: int = 500000,
+        evict_every: int = 1000,
+    ):
+        self.col = collection
+        self.model = model
+        self.max_memory_items = max_memory_items
+        self.max_persistent_items = max_persistent_items
+        self.evict_every = evict_every
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.hits_memory = 0
+        self.hits_persistent = 0
+        self.misses = 0
+        self._ready = False
+
+    def _ensure_ready(self):
+        # Deferred to first use so constructing the cache needs no connection
+        if self._ready:
+            return
+        self.col.create_index([("last_used_at", ASCENDING)], name="last_used_at")
+        self.col.create_index([("model", ASCENDING)], name="model")
+        self._check_model()
+        self._ready = True
+
+    # --------------------------------------------------
+    # Invalidation
+    # --------------------------------------------------
+    def _check_model(self):
+        meta = self.col.find_one({"_id": _META_ID})
+        if meta and meta.get("model") == self.model:
+            return
+        if meta:
+            result = self.col.delete_many({"_id": {"$ne": _META_ID}, "model": {"$ne": self.model}})
+            logger.info(
+                "Embedding model changed %s → %s, dropped %d cached embeddings",
+                meta.get("model"), self.model, result.deleted_count,
+            )
+        self.col.update_one({"_id": _META_ID}, {"$set": {"model": self.model}}, upsert=True)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self.col.delete_many({"_id": {"$ne": _META_ID}})
+
+    # --------------------------------------------------
+    # Lookup
+    # --------------------------------------------------
+    def _remember(self, key: str, embedding: List[float]):
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, List[float]]:
+        """Returns {text: embedding} for the texts that are cached."""
+        found: Dict[str, List[float]] = {}
+        keys = {}
+        for text in texts:
+            key = embedding_key(self.model, text)
+            with self._lock:
+                emb = self._memory.get(key)
+                if emb is not None:
+                    self._memory.move_to_end(key)
+            if emb is not None:
+                found[text] = emb
+                self.hits_memory += 1
+            else:
+                keys[key] = text
+
+        if keys:
+            self._ensure_ready()
+            docs = list(self.col.find({"_id": {"$in": list(keys)}}, {"embedding": 1}))
+            for doc in docs:
+                text = keys[doc["_id"]]
+                found[text] = doc["embedding"]
+                self._remember(doc["_id"], doc["embedding"])
+            self.hits_persistent += len(docs)
+            self.misses += len(keys) - len(docs)
+
+            if docs:
+                self.col.update_many(
+                    {"_id": {"$in": [d["_id"] for d in docs]}},
+                    {"$set": {"last_used_at": datetime.utcnow()}},
+                )
+        return found
+
+    def get(self, text: str) -> Optional[List[float]]:
+        return self.get_many([text]).get(text)
+
+    # --------------------------------------------------
+    # Store
+    # --------------------------------------------------
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        self._ensure_ready()
+        now = datetime.utcnow()
+        ops = []
+        for text, embedding in items.items():
+            key = embedding_key(self.model, text)
+            self._remember(key, embedding)
+            ops.append(UpdateOne(
+                {"_id": key},
+                {"$set": {"model": self.model, "embedding": embedding, "last_used_at": now}},
+                upsert=True,
+            ))
+        self.col.bulk_write(ops, ordered=False)
+
+        self._writes_since_evict += len(ops)
+        if self._writes_since_evict >= self.evict_every:
+            self._writes_since_evict = 0
+            self.evict()
+
+    def put(self, text: str, embedding: List[float]):
+        self.put_many({text: embedding})
+
+    def evict(self) -> int:
+        """Trims the Mongo tier to `max_persistent_items`, least recently used first."""
+        excess = self.col.estimated_document_count() - 1 - self.max_persistent_items
+        if excess <= 0:
+            return 0
+        stale = [
+            d["_id"] for d in
+            self.col.find({"_id": {"$ne": _META_ID}}, {"_id": 1}).sort("last_used_at", ASCENDING).limit(excess)
+        ]
+        result = self.col.delete_many({"_id": {"$in": stale}})
+        logger.info("Evicted %d cached embeddings", result.deleted_count)
+        return result.deleted_count
+
+    # --------------------------------------------------
+    # Metrics
+    # --------------------------------------------------
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits_memory + self.hits_persistent + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_persistent": self.hits_persistent,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "hit_rate": (self.hits_memory + self.hits_persistent) / lookups if lookups else 0.0,
+        }
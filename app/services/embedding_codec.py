@@ -0,0 +1,174 @@
+"""
+Compact storage for product embeddings.
+
+An embedding is stored either as a plain list of doubles ("float32", which
+Atlas `$vectorSearch` requires) or as BSON binary holding a scalar-quantized
+vector ("float16" or "int8"). The binary layout is an 8-byte header
+followed by the payload:
+
+    byte 0      dtype code (1 = float16, 2 = int8)
+    bytes 4-7   little-endian float32 scale (int8 only; 1.0 otherwise)
+
+At 768 dims a vector is ~6KB as BSON doubles, 1.5KB as float16 and
+0.77KB as int8. Decoding is a zero-copy `np.frombuffer` view over the
+BSON payload; `decode_matrix` casts those views straight into one float32
+matrix without going through Python lists.
+
+Measure the recall cost on the real catalog:
+
+    python -m app.services.embedding_codec --benchmark
+"""
+import argparse
+import os
+import struct
+from typing import Dict, List, Sequence
+
+import numpy as np
+from bson.binary import Binary
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+_HEADER = struct.Struct("<B3xf")
+_CODES = {"float16": 1, "int8": 2}
+_NP_DTYPES = {1: np.float16, 2: np.int8}
+
+# BSON user-defined binary subtype, so other readers don't mistake it for
+# the standard vector subtype
+_SUBTYPE = 0x80
+
+
+def encode_embedding(embedding: Sequence[float], dtype: str = "float32"):
+    """Value to store in a product's `embedding` field."""
+    if dtype == "float32":
+        return [float(x) for x in embedding]
+    if dtype not in _CODES:
+        raise ValueError(f"Unknown embedding storage dtype: {dtype}")
+
+    vec = np.asarray(embedding, dtype=np.float32)
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.abs(vec).max()) if vec.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        payload = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+    else:
+        payload = vec.astype(np.float16)
+
+    return Binary(_HEADER.pack(_CODES[dtype], scale) + payload.tobytes(), _SUBTYPE)
+
+
+def stored_dtype(value) -> str:
+    if isinstance(value, (bytes, bytearray)):
+        code = value[0]
+        return next(name for name, c in _CODES.items() if c == code)
+    return "float32"
+
+
+def _view(value):
+    """(zero-copy ndarray view, scale) of a stored embedding."""
+    if isinstance(value, (bytes, bytearray)):
+        code, scale = _HEADER.unpack_from(value)
+        return np.frombuffer(value, dtype=_NP_DTYPES[code], offset=_HEADER.size), scale
+    return np.asarray(value, dtype=np.float32), 1.0
+
+
+def decode_embedding(value) -> np.ndarray:
+    """
+    A stored embedding as an ndarray. float16 vectors come back as a
+    read-only view over the BSON bytes; int8 is dequantized to float32.
+    """
+    view, scale = _view(value)
+    if view.dtype == np.int8:
+        return view.astype(np.float32) * scale
+    return view
+
+
+def decode_matrix(values: Sequence) -> np.ndarray:
+    """Stacks stored embeddings into one contiguous (n, dim) float32 matrix."""
+    if not values:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    first, _ = _view(values[0])
+    matrix = np.empty((len(values), len(first)), dtype=np.float32)
+    for i, value in enumerate(values):
+        view, scale = _view(value)
+        matrix[i] = view  # casts in place, no intermediate copy
+        if scale != 1.0:
+            matrix[i] *= scale
+    return matrix
+
+
+# --------------------------------------------------
+# Benchmark / migration
+# --------------------------------------------------
+def quantization_report(vectors: np.ndarray, dtype: str, queries: int = 200, k: int = 3) -> Dict[str, float]:
+    """Storage size and recall@k of exact search over `dtype`-encoded vectors vs float32."""
+    from app.services.vector_index import normalize_rows
+
+    exact = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    encoded = [encode_embedding(v, dtype) for v in vectors]
+    quantized = normalize_rows(decode_matrix(encoded))
+
+    rng = np.random.default_rng(0)
+    q = exact[rng.choice(len(exact), min(queries, len(exact)), replace=False)]
+    k = min(k, len(exact))
+    truth = np.argsort(-(q @ exact.T), axis=1)[:, :k]
+    found = np.argsort(-(q @ quantized.T), axis=1)[:, :k]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+
+    size = sum(len(e) if isinstance(e, bytes) else 9 * len(e) for e in encoded) / len(encoded)
+    return {"dtype": dtype, "bytes_per_vector": size, "recall": hits / (k * len(q))}
+
+
+def migrate(products_col, dtype: str, batch_size: int = 500) -> int:
+    """Re-encodes every stored product embedding that is not already `dtype`."""
+    from pymongo import UpdateOne
+
+    ops: List[UpdateOne] = []
+    migrated = 0
+    for doc in products_col.find({"embedding": {"$exists": True, "$ne": None}}, {"embedding": 1}):
+        if stored_dtype(doc["embedding"]) == dtype:
+            continue
+        vec = decode_embedding(doc["embedding"])
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": encode_embedding(vec, dtype)}}))
+        if len(ops) >= batch_size:
+            migrated += products_col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        migrated += products_col.bulk_write(ops, ordered=False).modified_count
+    return migrated
+
+
+def _load_vectors(products_col) -> List:
+    return [d["embedding"] for d in products_col.find({"embedding": {"$exists": True, "$ne": None}}, {"embedding": 1})]
+
+
+def main():
+    from pymongo import MongoClient
+
+    from app.config.settings import settings
+
+    parser = argparse.ArgumentParser(description="Benchmark or migrate product embedding storage")
+    parser.add_argument("--mongo", default=os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    parser.add_argument("--db", default="rfp")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--migrate", choices=STORAGE_DTYPES, help="re-encode stored embeddings to this dtype")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    products = MongoClient(args.mongo)[args.db]["products"]
+
+    if args.benchmark:
+        vectors = decode_matrix(_load_vectors(products))
+        print(f"{len(vectors)} embedded products (configured: {settings.EMBEDDING_STORAGE_DTYPE})")
+        if len(vectors):
+            for dtype in STORAGE_DTYPES:
+                r = quantization_report(vectors, dtype, args.queries, args.k)
+                print(f"{dtype:>8}  {r['bytes_per_vector']:>7.0f} B/vector  recall@{args.k}={r['recall']:.3f}")
+
+    if args.migrate:
+        print(f"Re-encoded {migrate(products, args.migrate)} embeddings as {args.migrate}")
+
+
+if __name__ == "__main__":
+    main()
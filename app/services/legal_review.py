@@ -0,0 +1,278 @@
+"""
+Clause-level legal review.
+
+RFP text is split into clauses, and each clause is fingerprinted on its
+normalised wording. Verdicts are stored per fingerprint in
+`legal_clause_verdicts`, so boilerplate clauses repeated across tenders
+are reviewed only once. Only the clauses not seen before go to the model,
+in concurrent batches of numbered clauses. The result is merged into one
+compliance report, and review cost grows with new text rather than with
+document size.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.services.prompt_builder import PromptBuilder, count_tokens, fit_text
+
+logger = logging.getLogger(__name__)
+
+# Bump when the review prompt or verdict format changes; older verdicts
+# then stop matching and clauses are reviewed again
+PROMPT_VERSION = "1"
+
+RISK_LEVELS = ("low", "medium", "high")
+
+_BLOCK_BREAK = re.compile(
+    r"\n\s*\n"                                       # blank line
+    r"|\n(?=\s*(?:\d+(?:\.\d+)*[.)]|[a-z][.)]|[ivx]+[.)]|[-•*])\s)",  # numbered / bulleted item
+    re.IGNORECASE,
+)
+_SENTENCE_END = re.compile(r"(?<=[.;])\s+(?=[A-Z])")
+_NUMBERING = re.compile(r"^\s*(?:\d+(?:\.\d+)*[.)]|[a-z][.)]|[ivx]+[.)]|[-•*])\s+", re.IGNORECASE)
+# A period after these does not end a sentence ("Dr. Rao", "Clause No. 4")
+_ABBREVIATIONS = {
+    "mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "co.", "ltd.", "pvt.", "inc.", "corp.",
+    "no.", "nos.", "vs.", "etc.", "approx.", "viz.", "al.", "cl.", "sec.", "art.",
+    "para.", "fig.", "ref.", "rs.", "min.", "max.",
+}
+_INITIALS = re.compile(r"(?:[a-z]\.)+", re.IGNORECASE)  # "e.g.", "i.e.", "U.S.", "J."
+_SEPARATOR_LINE = re.compile(r"^[^\w\n]+$", re.MULTILINE)  # "---", "***", "====="
+_MIN_CLAUSE_CHARS = 15
+
+
+def _sentences(block: str) -> List[str]:
+    sentences, start = [], 0
+    for m in _SENTENCE_END.finditer(block):
+        words = block[start:m.start()].split()
+        last = words[-1].lower() if words else ""
+        if last in _ABBREVIATIONS or _INITIALS.fullmatch(last):
+            continue
+        sentences.append(block[start:m.start()])
+        start = m.end()
+    sentences.append(block[start:])
+    return sentences
+
+
+def split_clauses(text: str) -> List[str]:
+    """
+    Clauses of `text`, numbering stripped, in order, without duplicates.
+    Fragments shorter than _MIN_CLAUSE_CHARS are merged into a neighbour:
+    the previous clause of the same block ("... No refunds."), or else the
+    next clause (a heading such as "Liability"). No text is dropped; only
+    separator lines without any letter or digit ("---") are removed, and
+    they break blocks like a blank line.
+    """
+    text = _SEPARATOR_LINE.sub("", text or "")
+    clauses: List[str] = []
+    carry = ""
+    for block in _BLOCK_BREAK.split(text):
+        first = True
+        for part in _sentences(_NUMBERING.sub("", block)):
+            fragment = " ".join(part.split())
+            if not re.search(r"\w", fragment):
+                continue
+            if carry:
+                fragment, carry = f"{carry} {fragment}", ""
+            if len(fragment) >= _MIN_CLAUSE_CHARS:
+                clauses.append(fragment)
+            elif clauses and not first:
+                clauses[-1] = f"{clauses[-1]} {fragment}"
+            else:
+                carry = fragment
+            first = False
+    if carry:
+        # Trailing short text: attach to the last clause, or keep it alone
+        if clauses:
+            clauses[-1] = f"{clauses[-1]} {carry}"
+        else:
+            clauses.append(carry)
+    return list(dict.fromkeys(clauses))
+
+
+def clause_fingerprint(clause: str, model: str) -> str:
+    normalised = re.sub(r"[^a-z0-9%]+", " ", clause.lower()).strip()
+    return hashlib.sha256(f"{model}\0{PROMPT_VERSION}\0{normalised}".encode("utf-8")).hexdigest()
+
+
+_REVIEW_PROMPT = """
+You are a legal reviewer for a bidder responding to a tender.
+
+For each numbered clause below, assess the legal and compliance risk to
+the bidder. Respond with ONLY a JSON array, one object per clause, in order:
+[{{"clause": <number>, "risk": "low" | "medium" | "high", "issue": "<short reason or empty>", "recommendation": "<short action or empty>"}}]
+
+Clauses:
+{clauses}
+"""
+
+
+_CLAUSE_BUDGET = 300
+
+
+def _review_prompt(clauses: List[str], clause_budget: int = _CLAUSE_BUDGET) -> str:
+    # Clauses are never dropped (each needs a verdict), only capped in length
+    numbered = "\n".join(f"{i + 1}. {fit_text(c, clause_budget)}" for i, c in enumerate(clauses))
+    return PromptBuilder("legal_clauses", _REVIEW_PROMPT).raw("clauses", numbered).build()
+
+
+def _parse_verdicts(text: str, count: int) -> List[Optional[dict]]:
+    """Verdict per clause from the model's JSON; None where missing or malformed."""
+    verdicts: List[Optional[dict]] = [None] * count
+    match = re.search(r"\[.*\]", text or "", re.DOTALL)
+    if not match:
+        return verdicts
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return verdicts
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            idx = int(item.get("clause")) - 1
+        except (TypeError, ValueError):
+            continue
+        risk = str(item.get("risk", "")).lower()
+        if 0 <= idx < count and risk in RISK_LEVELS:
+            verdicts[idx] = {
+                "risk": risk,
+                "issue": str(item.get("issue") or ""),
+                "recommendation": str(item.get("recommendation") or ""),
+            }
+    return verdicts
+
+
+class ClauseVerdictStore:
+    """Verdicts by clause fingerprint: in-process dict in front of MongoDB."""
+
+    def __init__(self, collection):
+        self.col = collection
+        self._memory: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, fingerprints: List[str]) -> Dict[str, dict]:
+        with self._lock:
+            found = {f: self._memory[f] for f in fingerprints if f in self._memory}
+        missing = [f for f in fingerprints if f not in found]
+        if missing:
+            for doc in self.col.find({"_id": {"$in": missing}}, {"verdict": 1}):
+                found[doc["_id"]] = doc["verdict"]
+            with self._lock:
+                self._memory.update({f: found[f] for f in missing if f in found})
+        return found
+
+    def put_many(self, items: Dict[str, dict], clauses: Dict[str, str]):
+        if not items:
+            return
+        now = datetime.utcnow()
+        with self._lock:
+            self._memory.update(items)
+        self.col.bulk_write([
+            UpdateOne(
+                {"_id": fp},
+                {"$set": {"verdict": verdict, "clause": clauses[fp], "reviewed_at": now}},
+                upsert=True,
+            )
+            for fp, verdict in items.items()
+        ], ordered=False)
+
+
+class LegalReviewPipeline:
+
+    def __init__(
+        self,
+        llm,
+        model: str,
+        store: ClauseVerdictStore,
+        batch_size: int = 20,
+        concurrency: int = 4,
+        prompt_budgets: Optional[Dict[str, int]] = None,
+    ):
+        self.llm = llm
+        self.clause_budget = (prompt_budgets or {}).get("legal_clauses.clause", _CLAUSE_BUDGET)
+        self.model = model
+        self.store = store
+        self.batch_size = batch_size
+        self.concurrency = max(concurrency, 1)
+
+    async def _review_batch(self, clauses: List[str], slots: asyncio.Semaphore) -> List[Optional[dict]]:
+        async with slots:
+            try:
+                text = await self.llm.generate(_review_prompt(clauses, self.clause_budget), model=self.model, cache=True)
+            except Exception as e:
+                logger.warning("Legal review batch of %d clauses failed: %s", len(clauses), e)
+                return [None] * len(clauses)
+        return _parse_verdicts(text, len(clauses))
+
+    async def review(self, text: str) -> dict:
+        clauses = split_clauses(text)
+        fingerprints = [clause_fingerprint(c, self.model) for c in clauses]
+        by_fp = dict(zip(fingerprints, clauses))
+
+        try:
+            known = await asyncio.to_thread(self.store.get_many, fingerprints)
+        except Exception as e:
+            logger.warning("Clause verdict store unavailable: %s", e)
+            known = {}
+        novel = [fp for fp in dict.fromkeys(fingerprints) if fp not in known]
+
+        slots = asyncio.Semaphore(self.concurrency)
+        batches = [novel[i:i + self.batch_size] for i in range(0, len(novel), self.batch_size)]
+        results = await asyncio.gather(*(
+            self._review_batch([by_fp[fp] for fp in batch], slots) for batch in batches
+        ))
+
+        fresh = {
+            fp: verdict
+            for batch, verdicts in zip(batches, results)
+            for fp, verdict in zip(batch, verdicts)
+            if verdict is not None
+        }
+        # A clause cut to fit its budget was judged on part of its text; the
+        # verdict is used for this report but not stored under its fingerprint
+        truncated = {fp for fp in fresh if count_tokens(by_fp[fp]) > self.clause_budget}
+        try:
+            await asyncio.to_thread(
+                self.store.put_many, {fp: v for fp, v in fresh.items() if fp not in truncated}, by_fp
+            )
+        except Exception as e:
+            logger.warning("Could not store clause verdicts: %s", e)
+
+        verdicts = {**known, **fresh}
+        report = self._report(clauses, fingerprints, verdicts, reviewed=len(fresh), reused=len(known))
+        report["truncated"] = len(truncated)
+        return report
+
+    def _report(self, clauses: List[str], fingerprints: List[str], verdicts: Dict[str, dict], reviewed: int, reused: int) -> dict:
+        risk_counts = {level: 0 for level in RISK_LEVELS}
+        findings, unreviewed = [], []
+        for clause, fp in zip(clauses, fingerprints):
+            verdict = verdicts.get(fp)
+            if verdict is None:
+                unreviewed.append(clause)
+                continue
+            risk_counts[verdict["risk"]] += 1
+            if verdict["risk"] != "low":
+                findings.append({"clause": clause, **verdict})
+
+        findings.sort(key=lambda f: -RISK_LEVELS.index(f["risk"]))
+        return {
+            # No clauses means there was nothing to review, not a clean bill
+            "compliant": bool(clauses) and not findings and not unreviewed,
+            "no_legal_text": not clauses,
+            "clauses": len(clauses),
+            "reviewed": reviewed,
+            "reused": reused,
+            "risk_counts": risk_counts,
+            "findings": findings,
+            "unreviewed": unreviewed,
+            "reviewed_at": datetime.utcnow(),
+        }
@@ -0,0 +1,169 @@
+"""In-process BM25 keyword index over the product catalog"""
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "as", "at", "be", "by", "for", "from", "in", "is", "of",
+    "on", "or", "the", "to", "with", "per", "all", "any", "shall", "should",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring over product name, description
+    and category. Postings are NumPy arrays (doc ids, term frequencies), so
+    scoring a query is a handful of vectorised adds over the postings of
+    its terms rather than a pass over the catalog.
+
+    Reloads like LocalVectorIndex: after `mark_stale()`, or when the product
+    count changed at the next `refresh_interval` check.
+    """
+
+    def __init__(
+        self,
+        products_col,
+        fields: Sequence[str] = ("name", "description", "category"),
+        k1: float = 1.2,
+        b: float = 0.75,
+        refresh_interval: float = 300.0,
+    ):
+        self.products_col = products_col
+        self.fields = tuple(fields)
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = refresh_interval
+
+        self.skus: List[str] = []
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        self._stale = True
+        self._loaded_count = -1
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # Loading
+    # --------------------------------------------------
+    def load(self):
+        projection = {"_id": 0, "sku": 1, **{f: 1 for f in self.fields}}
+        skus: List[str] = []
+        doc_len: List[int] = []
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+        for doc in self.products_col.find({"sku": {"$exists": True}}, projection):
+            doc_id = len(skus)
+            tokens = tokenize(" ".join(str(doc.get(f) or "") for f in self.fields))
+            for token in tokens:
+                postings[token][doc_id] = postings[token].get(doc_id, 0) + 1
+            skus.append(doc["sku"])
+            doc_len.append(len(tokens))
+
+        arrays = {
+            term: (np.fromiter(tf.keys(), dtype=np.int32, count=len(tf)),
+                   np.fromiter(tf.values(), dtype=np.float32, count=len(tf)))
+            for term, tf in postings.items()
+        }
+        with self._lock:
+            self.skus = skus
+            self._postings = arrays
+            self._doc_len = np.asarray(doc_len, dtype=np.float32)
+            self._loaded_count = len(skus)
+            self._stale = False
+            self._checked_at = time.monotonic()
+        logger.info("Loaded %d products, %d terms into BM25 index", len(skus), len(arrays))
+
+    def mark_stale(self):
+        self._stale = True
+
+    def refresh_if_needed(self):
+        if not self._stale and time.monotonic() - self._checked_at > self.refresh_interval:
+            self._checked_at = time.monotonic()
+            if self.products_col.count_documents({"sku": {"$exists": True}}) != self._loaded_count:
+                self._stale = True
+        if self._stale:
+            self.load()
+
+    # --------------------------------------------------
+    # Search
+    # --------------------------------------------------
+    def search(self, query: str, limit: int = 200) -> List[Tuple[str, float]]:
+        """(sku, bm25 score) of the best `limit` matches; [] when no term matches."""
+        self.refresh_if_needed()
+        with self._lock:
+            skus, postings, doc_len = self.skus, self._postings, self._doc_len
+
+        n = len(skus)
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t in postings]
+        if n == 0 or not terms:
+            return []
+
+        avg_len = float(doc_len.mean()) or 1.0
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            ids, tf = postings[term]
+            idf = np.log(1.0 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_len[ids] / avg_len)
+            scores[ids] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(skus[i], float(scores[i])) for i in matched]
+
+    def search_batch(self, queries: Sequence[Optional[str]], limit: int = 200) -> List[List[Tuple[str, float]]]:
+        return [self.search(q, limit) if q else [] for q in queries]
+
+
+# --------------------------------------------------
+# Fusion
+# --------------------------------------------------
+def fuse_scores(
+    candidates: List[Tuple[str, float]],
+    vector_scores: Optional[Dict[str, float]],
+    method: str = "weighted",
+    alpha: float = 0.7,
+    rrf_k: int = 60,
+) -> List[Tuple[str, float, Optional[float], float]]:
+    """
+    Combines lexical candidates with their vector scores, best first, as
+    (sku, fused, vector, lexical).
+
+    "weighted": alpha * vector + (1 - alpha) * lexical / max(lexical).
+    "rrf": reciprocal rank fusion, sum of 1 / (rrf_k + rank) over both lists.
+    With `vector_scores` None (the query has no embedding) candidates are
+    ranked by lexical / max(lexical) alone and their vector score is None.
+    """
+    if vector_scores is None:
+        top_lex = max((lex for _, lex in candidates), default=0.0) or 1.0
+        return sorted(((sku, lex / top_lex, None, lex) for sku, lex in candidates), key=lambda f: -f[1])
+
+    scored = [(sku, lex, vector_scores[sku]) for sku, lex in candidates if sku in vector_scores]
+    if not scored:
+        return []
+
+    if method == "rrf":
+        lex_rank = {sku: r for r, (sku, _, _) in enumerate(sorted(scored, key=lambda s: -s[1]))}
+        vec_rank = {sku: r for r, (sku, _, _) in enumerate(sorted(scored, key=lambda s: -s[2]))}
+        fused = [
+            (sku, 1.0 / (rrf_k + lex_rank[sku] + 1) + 1.0 / (rrf_k + vec_rank[sku] + 1), vec, lex)
+            for sku, lex, vec in scored
+        ]
+    else:
+        top_lex = max(lex for _, lex, _ in scored) or 1.0
+        fused = [(sku, alpha * vec + (1.0 - alpha) * lex / top_lex, vec, lex) for sku, lex, vec in scored]
+
+    return sorted(fused, key=lambda f: -f[1])
@@ -0,0 +1,129 @@
+"""Response cache for deterministic LLM calls: in-process LRU in front of MongoDB"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of generated text keyed by hash(model, prompt, config)
+    (see `llm_gateway.call_key`).
+
+    Lookups hit an in-process LRU first, then the Mongo collection. Mongo
+    entries expire `ttl` after they were written (TTL index on expires_at)
+    and the collection is trimmed back to `max_persistent_items` by least
+    recent use.
+    """
+
+    def __init__(
+        self,
+        collection,
+        ttl: timedelta = timedelta(days=7),
+        max_memory_items: int = 2000,
+        max_persistent_items: int = 100000,
+        evict_every: int = 500,
+    ):
+        self.col = collection
+        self.ttl = ttl
+        self.max_memory_items = max_memory_items
+        self.max_persistent_items = max_persistent_items
+        self.evict_every = evict_every
+
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.hits_memory = 0
+        self.hits_persistent = 0
+        self.misses = 0
+        self._ready = False
+
+    def _ensure_ready(self):
+        # Deferred to first use so constructing the cache needs no connection
+        if self._ready:
+            return
+        self.col.create_index([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0)
+        self.col.create_index([("last_used_at", ASCENDING)], name="last_used_at")
+        self._ready = True
+
+    def _remember(self, key: str, text: str):
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    # --------------------------------------------------
+    # Lookup / store
+    # --------------------------------------------------
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+        if text is not None:
+            self.hits_memory += 1
+            return text
+
+        self._ensure_ready()
+        now = datetime.utcnow()
+        # The TTL monitor runs about once a minute, so check expiry here too
+        doc = self.col.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}},
+            projection={"text": 1},
+        )
+        if doc is None:
+            self.misses += 1
+            return None
+        self.hits_persistent += 1
+        self._remember(key, doc["text"])
+        return doc["text"]
+
+    def put(self, key: str, model: str, text: str):
+        self._remember(key, text)
+        self._ensure_ready()
+        now = datetime.utcnow()
+        self.col.update_one(
+            {"_id": key},
+            {"$set": {"model": model, "text": text, "last_used_at": now, "expires_at": now + self.ttl}},
+            upsert=True,
+        )
+
+        self._writes_since_evict += 1
+        if self._writes_since_evict >= self.evict_every:
+            self._writes_since_evict = 0
+            self.evict()
+
+    def evict(self) -> int:
+        """Trims the Mongo tier to `max_persistent_items`, least recently used first."""
+        excess = self.col.estimated_document_count() - self.max_persistent_items
+        if excess <= 0:
+            return 0
+        stale = [d["_id"] for d in self.col.find({}, {"_id": 1}).sort("last_used_at", ASCENDING).limit(excess)]
+        result = self.col.delete_many({"_id": {"$in": stale}})
+        logger.info("Evicted %d cached LLM responses", result.deleted_count)
+        return result.deleted_count
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self.col.delete_many({})
+
+    # --------------------------------------------------
+    # Metrics
+    # --------------------------------------------------
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits_memory + self.hits_persistent + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_persistent": self.hits_persistent,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "hit_rate": (self.hits_memory + self.hits_persistent) / lookups if lookups else 0.0,
+        }
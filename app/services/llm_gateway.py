@@ -0,0 +1,496 @@
+"""
+Single entry point for Gemini calls.
+
+Every agent goes through the process-wide `LLMGateway` from
+`get_gateway()` instead of calling `genai` directly. The gateway:
+
+- configures `genai` once, so agents no longer overwrite each other's key
+- keeps one `GenerativeModel` handle per (model, generation config)
+- bounds concurrent calls globally and per model
+- paces requests per model with a token bucket sized to the provider
+  quota, and retries 429s with jittered backoff
+- coalesces identical in-flight calls (singleflight): concurrent callers
+  with the same model, prompt and config share one provider call
+- serves deterministic calls (temperature 0, or `cache=True`) from an
+  optional response cache (see llm_cache)
+- can record provider responses as fixtures or replay them offline
+  (LLM_BACKEND, see llm_replay)
+
+Both blocking (worker threads) and async callers are supported; the
+limits are shared between them.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+_RATE_LIMITED = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+
+
+class _LeaderCancelled(Exception):
+    """Set on a coalesced call whose leader was cancelled; followers retry."""
+
+# Async waiters poll thread-safe primitives so they stay cancellable and
+# work from any event loop (agents run in threads with their own loops)
+_POLL_MIN = 0.005
+_POLL_MAX = 0.05
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Takes `tokens` and returns how long the caller must wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def penalize(self, seconds: float):
+        """Holds every caller back after a provider 429."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def acquire(self, tokens: float = 1.0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def _acquire_async(sem: threading.Semaphore):
+    delay = _POLL_MIN
+    while not sem.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, _POLL_MAX)
+
+
+def call_key(model: str, payload: Any, generation_config: Optional[dict] = None) -> str:
+    material = json.dumps(
+        {"model": model, "payload": payload, "config": generation_config or {}},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMGateway:
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrency: int = 16,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        requests_per_minute: Optional[Dict[str, int]] = None,
+        max_retries: int = 3,
+        retry_base_delay: float = 2.0,
+        response_cache=None,
+        recorder=None,
+        replay=None,
+    ):
+        self.api_key = None
+        self.response_cache = response_cache
+        # llm_replay.FixtureStore to record into / ReplayBackend to serve from
+        self.recorder = recorder
+        self.replay = replay
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._model_concurrency = {"default": 8, **(model_concurrency or {})}
+        self._rpm = {"default": 60, **(requests_per_minute or {})}
+        self._model_sems: Dict[str, threading.BoundedSemaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._models: Dict[Tuple[str, str], genai.GenerativeModel] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+
+        if api_key:
+            self.configure(api_key)
+
+    # --------------------------------------------------
+    # Setup
+    # --------------------------------------------------
+    def configure(self, api_key: Optional[str], override: bool = True):
+        """Sets the process-wide key. With override=False only fills in a missing key."""
+        if not api_key or (self.api_key and not override) or api_key == self.api_key:
+            return
+        genai.configure(api_key=api_key)
+        self.api_key = api_key
+
+    def model(self, name: str, generation_config: Optional[dict] = None) -> genai.GenerativeModel:
+        key = (name, json.dumps(generation_config or {}, sort_keys=True))
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = genai.GenerativeModel(name, generation_config=generation_config)
+            return self._models[key]
+
+    def _limits(self, model: str) -> Tuple[threading.BoundedSemaphore, TokenBucket]:
+        with self._lock:
+            if model not in self._model_sems:
+                limit = self._model_concurrency.get(model, self._model_concurrency["default"])
+                rpm = self._rpm.get(model, self._rpm["default"])
+                self._model_sems[model] = threading.BoundedSemaphore(limit)
+                # Burst of a few seconds' worth of quota, never below 1
+                self._buckets[model] = TokenBucket(rpm / 60.0, capacity=max(1.0, rpm / 20.0))
+            return self._model_sems[model], self._buckets[model]
+
+    # --------------------------------------------------
+    # Response cache
+    # --------------------------------------------------
+    def _cacheable(self, generation_config: Optional[dict], cache: Optional[bool]) -> bool:
+        if self.response_cache is None or cache is False:
+            return False
+        return bool(cache) or (generation_config or {}).get("temperature") == 0
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        try:
+            return self.response_cache.get(key)
+        except Exception as e:
+            logger.warning("LLM response cache unavailable: %s", e)
+            return None
+
+    def _cache_put(self, key: str, model: str, text: str):
+        try:
+            self.response_cache.put(key, model, text)
+        except Exception as e:
+            logger.warning("LLM response cache write failed: %s", e)
+
+    # --------------------------------------------------
+    # Provider (live, recording or replayed)
+    # --------------------------------------------------
+    def _record(self, key: str, kind: str, model: str, prompt: Any, response: Any):
+        try:
+            self.recorder.save(key, kind, model, prompt, response)
+        except Exception as e:
+            logger.warning("Could not record LLM fixture %s: %s", key, e)
+
+    def _provider_generate(self, handle, key: str, model: str, prompt: str, timeout: float) -> str:
+        if self.replay is not None:
+            return self.replay.call(key)
+        text = handle.generate_content(prompt, request_options={"timeout": timeout}).text.strip()
+        if self.recorder is not None:
+            self._record(key, "generate", model, prompt, text)
+        return text
+
+    async def _provider_generate_async(self, handle, key: str, model: str, prompt: str, timeout: float) -> str:
+        if self.replay is not None:
+            return await self.replay.call_async(key)
+        response = await handle.generate_content_async(prompt, request_options={"timeout": timeout})
+        text = response.text.strip()
+        if self.recorder is not None:
+            self._record(key, "generate", model, prompt, text)
+        return text
+
+    async def _provider_stream(self, handle, key: str, model: str, prompt: str, timeout: float) -> AsyncIterator[str]:
+        if self.replay is not None:
+            async for chunk in self.replay.stream(key):
+                yield chunk
+            return
+        parts: List[str] = []
+        response = await handle.generate_content_async(prompt, stream=True, request_options={"timeout": timeout})
+        async for chunk in response:
+            parts.append(chunk.text)
+            yield chunk.text
+        if self.recorder is not None:
+            self._record(key, "generate", model, prompt, "".join(parts).strip())
+
+    def _provider_embed(self, key: str, model: str, content, timeout: float):
+        if self.replay is not None:
+            return self.replay.call(key)
+        embedding = genai.embed_content(model=model, content=content, request_options={"timeout": timeout})["embedding"]
+        if self.recorder is not None:
+            self._record(key, "embed", model, content, embedding)
+        return embedding
+
+    def _backoff(self, attempt: int) -> float:
+        return self.retry_base_delay * (2 ** attempt) * (0.5 + random.random())
+
+    # --------------------------------------------------
+    # Blocking calls
+    # --------------------------------------------------
+    def _call(self, model: str, fn: Callable[[], Any]) -> Any:
+        sem, bucket = self._limits(model)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            with self._global, sem:
+                try:
+                    self.calls += 1
+                    return fn()
+                except _RATE_LIMITED:
+                    self.rate_limited += 1
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                    bucket.penalize(delay)
+            logger.warning("Rate limited by provider on %s, retrying in %.1fs", model, delay)
+
+    def _release(self, key: str, fut: Future, result: Any = None, exc: Optional[BaseException] = None):
+        """Drops the in-flight entry, then resolves it for the followers."""
+        with self._lock:
+            self._inflight.pop(key, None)
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def _singleflight(self, key: str, run: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                fut = self._inflight.get(key)
+                leader = fut is None
+                if leader:
+                    fut = self._inflight[key] = Future()
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            try:
+                return fut.result()
+            except _LeaderCancelled:
+                continue
+
+        try:
+            result = run()
+        except BaseException as e:
+            self._release(key, fut, exc=e)
+        else:
+            self._release(key, fut, result=result)
+        return fut.result()
+
+    def generate_sync(
+        self,
+        prompt: str,
+        model: str,
+        generation_config: Optional[dict] = None,
+        timeout: float = 120,
+        cache: Optional[bool] = None,
+    ) -> str:
+        """
+        Text of one generate_content call. `cache=True` opts a call into the
+        response cache; temperature-0 calls use it unless `cache=False`.
+        """
+        handle = self.model(model, generation_config)
+        key = call_key(model, prompt, generation_config)
+        cacheable = self._cacheable(generation_config, cache)
+        if cacheable:
+            text = self._cache_get(key)
+            if text is not None:
+                return text
+
+        def run():
+            text = self._call(model, lambda: self._provider_generate(handle, key, model, prompt, timeout))
+            if cacheable:
+                self._cache_put(key, model, text)
+            return text
+
+        return self._singleflight(key, run)
+
+    def embed(self, content: str | List[str], model: str, timeout: float = 120) -> Any:
+        """`embedding` of an embed_content call (a list of vectors for a list of texts)."""
+        key = call_key(model, content)
+
+        def run():
+            return self._call(model, lambda: self._provider_embed(key, model, content, timeout))
+
+        return self._singleflight(key, run)
+
+    # --------------------------------------------------
+    # Async calls
+    # --------------------------------------------------
+    async def _call_async(self, model: str, fn: Callable[[], Any]) -> Any:
+        sem, bucket = self._limits(model)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire_async()
+            await _acquire_async(self._global)
+            try:
+                await _acquire_async(sem)
+                try:
+                    self.calls += 1
+                    return await fn()
+                except _RATE_LIMITED:
+                    self.rate_limited += 1
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                    bucket.penalize(delay)
+                finally:
+                    sem.release()
+            finally:
+                self._global.release()
+            logger.warning("Rate limited by provider on %s, retrying in %.1fs", model, delay)
+
+    async def generate(
+        self,
+        prompt: str,
+        model: str,
+        generation_config: Optional[dict] = None,
+        timeout: float = 120,
+        cache: Optional[bool] = None,
+    ) -> str:
+        handle = self.model(model, generation_config)
+        key = call_key(model, prompt, generation_config)
+        cacheable = self._cacheable(generation_config, cache)
+        if cacheable:
+            text = await asyncio.to_thread(self._cache_get, key)
+            if text is not None:
+                return text
+
+        while True:
+            with self._lock:
+                fut = self._inflight.get(key)
+                leader = fut is None
+                if leader:
+                    fut = self._inflight[key] = Future()
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            try:
+                # Shielded: cancelling one follower must not cancel the shared call
+                return await asyncio.shield(asyncio.wrap_future(fut))
+            except _LeaderCancelled:
+                # The leader was cancelled; retry, and one follower takes over
+                continue
+
+        async def run():
+            return await self._provider_generate_async(handle, key, model, prompt, timeout)
+
+        try:
+            text = await self._call_async(model, run)
+            if cacheable:
+                await asyncio.to_thread(self._cache_put, key, model, text)
+        except asyncio.CancelledError:
+            # Cancellation (e.g. the leader's own wait_for timeout) belongs to
+            # the leader only; followers are released to retry the call
+            self._release(key, fut, exc=_LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._release(key, fut, exc=e)
+        else:
+            self._release(key, fut, result=text)
+        return fut.result()
+
+    async def stream(
+        self,
+        prompt: str,
+        model: str,
+        generation_config: Optional[dict] = None,
+        timeout: float = 120,
+        cache: Optional[bool] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Text chunks of a streamed call. Streams are never coalesced; a
+        cached response is yielded as a single chunk, and a completed stream
+        is cached like `generate` would be.
+        """
+        handle = self.model(model, generation_config)
+        key = call_key(model, prompt, generation_config)
+        cacheable = self._cacheable(generation_config, cache)
+        if cacheable:
+            text = await asyncio.to_thread(self._cache_get, key)
+            if text is not None:
+                yield text
+                return
+        sem, bucket = self._limits(model)
+        parts: List[str] = []
+
+        await bucket.acquire_async()
+        await _acquire_async(self._global)
+        try:
+            await _acquire_async(sem)
+            try:
+                self.calls += 1
+                async for text in self._provider_stream(handle, key, model, prompt, timeout):
+                    parts.append(text)
+                    yield text
+            finally:
+                sem.release()
+        finally:
+            self._global.release()
+
+        if cacheable:
+            await asyncio.to_thread(self._cache_put, key, model, "".join(parts).strip())
+
+    # --------------------------------------------------
+    # Metrics
+    # --------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "in_flight": len(self._inflight),
+        }
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.stats()
+        if self.replay is not None:
+            stats["replay"] = self.replay.stats()
+        return stats
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Returns the process-wide LLMGateway configured from settings."""
+    global _gateway
+    if _gateway is None:
+        from app.config.settings import settings
+
+        with _gateway_lock:
+            if _gateway is None:
+                response_cache = None
+                if settings.LLM_CACHE_ENABLED:
+                    from datetime import timedelta
+
+                    from app.event_bus.mongo_bus import get_db
+                    from app.services.llm_cache import LLMResponseCache
+
+                    response_cache = LLMResponseCache(
+                        get_db()["llm_cache"],
+                        ttl=timedelta(hours=settings.LLM_CACHE_TTL_HOURS),
+                        max_persistent_items=settings.LLM_CACHE_MAX_ITEMS,
+                    )
+                from app.services.llm_replay import build_backend
+
+                recorder, replay = build_backend(settings)
+                _gateway = LLMGateway(
+                    api_key=settings.GENAI_API_KEY,
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    model_concurrency=settings.LLM_MODEL_CONCURRENCY,
+                    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+                    response_cache=response_cache,
+                    recorder=recorder,
+                    replay=replay,
+                )
+    return _gateway
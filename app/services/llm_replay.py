@@ -0,0 +1,176 @@
+"""
+Record/replay of provider calls for offline, repeatable pipeline runs.
+
+LLM_BACKEND=record runs live and saves every generate/embed response as a
+fixture keyed by `call_key(model, prompt, config)`; LLM_BACKEND=replay
+serves calls from those fixtures only, with optional synthetic latency
+and injected errors. Injected behaviour is seeded per call (seed, key and
+how many times that key was replayed), so a replay run is reproducible
+regardless of scheduling order.
+
+Fixtures are one JSON file per call under LLM_FIXTURES_PATH:
+
+    <key[:2]>/<key>.json   {"kind", "model", "prompt", "response", "recorded_at"}
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+_ERRORS = {
+    "unavailable": lambda: google_exceptions.ServiceUnavailable("injected by LLM replay"),
+    "rate_limit": lambda: google_exceptions.ResourceExhausted("injected by LLM replay"),
+    "timeout": lambda: google_exceptions.DeadlineExceeded("injected by LLM replay"),
+}
+
+
+class FixtureMissing(KeyError):
+    """No recorded response for a replayed call."""
+
+
+class FixtureStore:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._memory: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def save(self, key: str, kind: str, model: str, prompt: Any, response: Any):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {
+            "kind": kind,
+            "model": model,
+            "prompt": prompt,
+            "response": response,
+            "recorded_at": datetime.utcnow().isoformat(),
+        }
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        with self._lock:
+            self._memory[key] = response
+
+    def load(self, key: str) -> Any:
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                response = json.load(f)["response"]
+        except FileNotFoundError:
+            raise FixtureMissing(key) from None
+        with self._lock:
+            self._memory[key] = response
+        return response
+
+
+class ReplayBackend:
+    """
+    Serves recorded responses. Each call waits `latency_ms` ± `jitter_ms`
+    and fails with probability `error_rate` (error kind: "unavailable",
+    "rate_limit" or "timeout"). Streams are split into `stream_chunks`
+    pieces, with the latency spread across them.
+    """
+
+    def __init__(
+        self,
+        store: FixtureStore,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error: str = "unavailable",
+        seed: int = 0,
+        stream_chunks: int = 8,
+    ):
+        if error not in _ERRORS:
+            raise ValueError(f"Unknown injected error: {error}")
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error = error
+        self.seed = seed
+        self.stream_chunks = max(stream_chunks, 1)
+
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self.injected_errors = 0
+
+    def _plan(self, key: str):
+        """(latency seconds, error or None) for the next replay of `key`."""
+        with self._lock:
+            n = self._counts[key]
+            self._counts[key] += 1
+            self.replayed += 1
+        rng = random.Random(f"{self.seed}:{key}:{n}")
+        latency = max(0.0, self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+        error = None
+        if rng.random() < self.error_rate:
+            with self._lock:
+                self.injected_errors += 1
+            error = _ERRORS[self.error]()
+        return latency, error
+
+    def call(self, key: str) -> Any:
+        latency, error = self._plan(key)
+        time.sleep(latency)
+        if error:
+            raise error
+        return self.store.load(key)
+
+    async def call_async(self, key: str) -> Any:
+        latency, error = self._plan(key)
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        return self.store.load(key)
+
+    async def stream(self, key: str):
+        latency, error = self._plan(key)
+        text = self.store.load(key)
+        size = max(1, -(-len(text) // self.stream_chunks))
+        chunks: List[str] = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, chunk in enumerate(chunks):
+            await asyncio.sleep(latency / len(chunks))
+            if error and i == len(chunks) // 2:
+                raise error
+            yield chunk
+
+    def stats(self) -> Dict[str, int]:
+        return {"replayed": self.replayed, "injected_errors": self.injected_errors}
+
+
+def build_backend(settings) -> tuple[Optional[FixtureStore], Optional[ReplayBackend]]:
+    """(recorder, replay) for LLM_BACKEND; both None when live."""
+    mode = settings.LLM_BACKEND.lower()
+    if mode == "live":
+        return None, None
+    store = FixtureStore(settings.LLM_FIXTURES_PATH)
+    if mode == "record":
+        return store, None
+    if mode == "replay":
+        return None, ReplayBackend(
+            store,
+            latency_ms=settings.LLM_REPLAY_LATENCY_MS,
+            jitter_ms=settings.LLM_REPLAY_JITTER_MS,
+            error_rate=settings.LLM_REPLAY_ERROR_RATE,
+            error=settings.LLM_REPLAY_ERROR,
+            seed=settings.LLM_REPLAY_SEED,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND}")
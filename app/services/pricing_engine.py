@@ -0,0 +1,202 @@
+"""Price book and line pricing for recommended products"""
+import logging
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PRICE_PROJECTION = {"_id": 0, "sku": 1, "name": 1, "price": 1, "unit": 1}
+
+WATCH_RETRY_MIN_DELAY = 1.0
+WATCH_RETRY_MAX_DELAY = 300.0
+
+# --------------------------------------------------
+# Quantities
+# --------------------------------------------------
+# alias → (canonical unit, factor to canonical)
+_UNITS: Dict[str, Tuple[str, float]] = {
+    "sqm": ("m2", 1.0), "sq.m": ("m2", 1.0), "sq m": ("m2", 1.0), "m2": ("m2", 1.0),
+    "sq.mt": ("m2", 1.0), "sq.mtr": ("m2", 1.0), "square meter": ("m2", 1.0),
+    "square meters": ("m2", 1.0), "square metre": ("m2", 1.0), "square metres": ("m2", 1.0),
+    "sqft": ("m2", 0.09290304), "sq.ft": ("m2", 0.09290304), "sq ft": ("m2", 0.09290304),
+    "ft2": ("m2", 0.09290304), "square feet": ("m2", 0.09290304),
+    "m": ("m", 1.0), "rm": ("m", 1.0), "rmt": ("m", 1.0), "mtr": ("m", 1.0),
+    "meter": ("m", 1.0), "meters": ("m", 1.0), "metre": ("m", 1.0), "metres": ("m", 1.0),
+    "running meter": ("m", 1.0), "ft": ("m", 0.3048), "feet": ("m", 0.3048),
+    "l": ("l", 1.0), "ltr": ("l", 1.0), "litre": ("l", 1.0), "litres": ("l", 1.0),
+    "liter": ("l", 1.0), "liters": ("l", 1.0), "ml": ("l", 0.001),
+    "kg": ("kg", 1.0), "kgs": ("kg", 1.0), "g": ("kg", 0.001), "ton": ("kg", 1000.0),
+    "tonne": ("kg", 1000.0), "mt": ("kg", 1000.0),
+    "nos": ("unit", 1.0), "no": ("unit", 1.0), "no.": ("unit", 1.0), "nos.": ("unit", 1.0),
+    "unit": ("unit", 1.0), "units": ("unit", 1.0), "pcs": ("unit", 1.0), "pc": ("unit", 1.0),
+    "each": ("unit", 1.0), "set": ("unit", 1.0), "sets": ("unit", 1.0),
+}
+
+_QUANTITY = re.compile(r"^\s*([0-9][0-9,]*(?:\.[0-9]+)?)\s*(.*?)\s*$")
+
+
+def normalize_unit(unit: str) -> Tuple[Optional[str], float]:
+    """(canonical unit, factor) for a unit string; (None, 1.0) if unknown."""
+    key = re.sub(r"\s+", " ", (unit or "").strip().lower())
+    if key in _UNITS:
+        return _UNITS[key]
+    key = key.rstrip(".")
+    return _UNITS.get(key, (None, 1.0))
+
+
+def parse_quantity(text) -> Tuple[Optional[float], Optional[str]]:
+    """
+    "5000 sq.m" → (5000.0, "m2"); "1,200 sq ft" → (111.48, "m2").
+    A bare number has no unit: (5000.0, None), read as the price unit.
+    Returns (None, None) when the text has no leading number or an
+    unknown unit.
+    """
+    if isinstance(text, (int, float)):
+        return float(text), None
+    match = _QUANTITY.match(str(text or ""))
+    if not match:
+        return None, None
+    if not match.group(2):
+        return float(match.group(1).replace(",", "")), None
+    unit, factor = normalize_unit(match.group(2))
+    if unit is None:
+        return None, None
+    return float(match.group(1).replace(",", "")) * factor, unit
+
+
+# --------------------------------------------------
+# Price book
+# --------------------------------------------------
+class PriceBook:
+    """
+    In-memory sku → price entries, filled on demand with one `$in` query
+    for whatever SKUs a lookup is missing.
+
+    `version` increases on every invalidation. Entries expire `ttl` seconds
+    after they were loaded; `watch()` additionally drops entries as soon as
+    their product changes (MongoDB change stream, replica sets only).
+    """
+
+    def __init__(self, products_col, ttl: float = 600.0):
+        self.products_col = products_col
+        self.ttl = ttl
+        self.version = 0
+
+        self._entries: Dict[str, dict] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    def get_many(self, skus: Iterable[str]) -> Dict[str, dict]:
+        """{sku: {sku, name, price, unit}} for the SKUs that exist."""
+        skus = list(dict.fromkeys(skus))
+        now = time.monotonic()
+        with self._lock:
+            found = {
+                s: self._entries[s] for s in skus
+                if s in self._entries and now - self._loaded_at[s] < self.ttl
+            }
+        missing = [s for s in skus if s not in found]
+
+        if missing:
+            docs = list(self.products_col.find({"sku": {"$in": missing}}, _PRICE_PROJECTION))
+            with self._lock:
+                for doc in docs:
+                    self._entries[doc["sku"]] = doc
+                    self._loaded_at[doc["sku"]] = now
+            found.update({d["sku"]: d for d in docs})
+        return found
+
+    def invalidate(self, skus: Optional[Iterable[str]] = None):
+        with self._lock:
+            if skus is None:
+                self._entries.clear()
+                self._loaded_at.clear()
+            else:
+                for sku in skus:
+                    self._entries.pop(sku, None)
+                    self._loaded_at.pop(sku, None)
+            self.version += 1
+
+    # --------------------------------------------------
+    # Change notifications
+    # --------------------------------------------------
+    def _watch_loop(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        delay = WATCH_RETRY_MIN_DELAY
+        while True:
+            try:
+                with self.products_col.watch(pipeline, full_document="updateLookup") as stream:
+                    # Changes may have been missed while the stream was down
+                    self.invalidate()
+                    delay = WATCH_RETRY_MIN_DELAY
+                    for change in stream:
+                        doc = change.get("fullDocument") or {}
+                        if doc.get("sku"):
+                            self.invalidate([doc["sku"]])
+                        else:
+                            # delete (no document left) — drop everything
+                            self.invalidate()
+            except Exception as e:
+                logger.warning("Price book change stream unavailable, retrying in %.0fs (TTL meanwhile): %s", delay, e)
+            time.sleep(delay)
+            delay = min(delay * 2, WATCH_RETRY_MAX_DELAY)
+
+    def watch(self):
+        """Starts a daemon thread that invalidates entries on product changes."""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(target=self._watch_loop, name="price-book-watch", daemon=True)
+        self._watcher.start()
+
+
+# --------------------------------------------------
+# Line pricing
+# --------------------------------------------------
+def price_lines(lines: List[dict], book: Dict[str, dict]) -> Tuple[List[dict], float]:
+    """
+    Prices `lines` ({sku, quantity, ...}) against `book` in one pass of
+    array arithmetic. Adds quantity_value, quantity_unit, unit_price and
+    line_total to each line. A line_total is None when the price is missing
+    or the product's price unit doesn't match the requested quantity.
+    Returns (lines, subtotal); lines with `selected` False (alternatives)
+    are priced but not added to the subtotal.
+    """
+    n = len(lines)
+    qty = np.full(n, np.nan)
+    price = np.full(n, np.nan)
+    factor = np.ones(n)
+    units: List[Optional[str]] = [None] * n
+
+    for i, line in enumerate(lines):
+        value, units[i] = parse_quantity(line.get("quantity"))
+        if value is not None:
+            qty[i] = value
+        entry = book.get(line["sku"])
+        if entry is None or entry.get("price") is None:
+            continue
+        price[i] = entry["price"]
+        if entry.get("unit") and value is not None:
+            price_unit, price_factor = normalize_unit(entry["unit"])
+            if units[i] is None:
+                # A unitless quantity is counted in the price unit
+                units[i] = price_unit
+                qty[i] *= price_factor
+                factor[i] = 1.0 / price_factor
+            else:
+                # Price per product unit; rescale to the requested unit
+                factor[i] = 1.0 / price_factor if price_unit == units[i] else np.nan
+
+    totals = qty * price * factor
+    for i, line in enumerate(lines):
+        line["quantity_value"] = None if np.isnan(qty[i]) else float(qty[i])
+        line["quantity_unit"] = units[i]
+        line["unit_price"] = None if np.isnan(price[i]) else float(price[i])
+        line["line_total"] = None if np.isnan(totals[i]) else round(float(totals[i]), 2)
+
+    in_subtotal = np.array([line.get("selected", True) for line in lines], dtype=bool)
+    return lines, round(float(np.nansum(totals[in_subtotal])), 2)
@@ -0,0 +1,220 @@
+"""
+Token-budgeted prompt construction.
+
+Each variable part of a prompt (RFP text, product lists, clauses) gets a
+token budget. Inputs over budget are compressed in order:
+
+1. dedupe: repeated sentences / list items are dropped
+2. ranked truncation: text keeps its leading sentences (RFPs front-load
+   the scope), lists keep their highest-ranked items
+3. overflow summary: what was cut is replaced by one line noting how
+   much was omitted and its most frequent key terms
+
+Token counts are a local estimate (no provider round trip), close enough
+to keep prompts within budget. Sizes before/after compression are recorded
+per prompt name in `prompt_metrics`.
+"""
+import logging
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE = re.compile(r"(?<=[.!?;])\s+|\n+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "shall", "will", "are",
+    "be", "of", "to", "in", "on", "or", "by", "as", "is", "an", "a", "at", "all",
+}
+
+
+def count_tokens(text: str) -> int:
+    """Estimated token count: one per punctuation mark, ~4 characters per word piece."""
+    return sum(max(1, -(-len(p) // 4)) for p in _PIECE.findall(text or ""))
+
+
+_MAX_TERM_CHARS = 20
+
+
+def _key_terms(texts: Iterable[str], n: int = 5) -> List[str]:
+    words = Counter(
+        w for t in texts for w in re.findall(r"[a-z][a-z0-9-]{2,}", t.lower())
+        if w not in _STOPWORDS and len(w) <= _MAX_TERM_CHARS
+    )
+    return [w for w, _ in words.most_common(n)]
+
+
+def _note_reserve(budget: int) -> int:
+    # Room kept for the overflow note once input has to be cut
+    return min(24, budget // 4)
+
+
+def _overflow_note(dropped: List[str], unit: str, budget: int, truncated: bool = False) -> str:
+    """One line on what was cut, with as many key terms as fit in `budget` tokens."""
+    parts = ["truncated"] if truncated else []
+    if len(dropped) > truncated:
+        parts.append(f"{len(dropped) - truncated} more {unit} omitted")
+    terms = _key_terms(dropped)
+    while True:
+        note = "[" + "; ".join(parts + ([f"key terms: {', '.join(terms)}"] if terms else [])) + "]"
+        if not terms or count_tokens(note) <= budget:
+            return note
+        terms.pop()
+
+
+def _cut(text: str, budget: int) -> str:
+    """Leading words of `text` within `budget` tokens; a single overlong word is cut by characters."""
+    kept: List[str] = []
+    used = 0
+    for word in text.split():
+        cost = count_tokens(word)
+        if used + cost > budget:
+            if not kept and budget > 0:
+                kept.append(word[:budget * 4])
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept)
+
+
+def fit_text(text: str, budget: int) -> str:
+    """
+    `text` deduplicated and cut to about `budget` tokens. Whole sentences
+    are kept while they fit; the first one that does not is cut at the
+    budget, and a note on what was cut is appended.
+    """
+    text = (text or "").strip()
+    if count_tokens(text) <= budget:
+        return text
+
+    sentences = list(dict.fromkeys(
+        " ".join(s.split()) for s in _SENTENCE.split(text) if s.strip()
+    ))
+    if sum(count_tokens(s) for s in sentences) <= budget:
+        return " ".join(sentences)
+
+    kept: List[str] = []
+    used = 0
+    reserve = _note_reserve(budget)
+    for i, sentence in enumerate(sentences):
+        cost = count_tokens(sentence)
+        if used + cost > budget - reserve:
+            head = _cut(sentence, budget - reserve - used)
+            if head:
+                kept.append(head)
+            rest = sentence[len(head):].strip()
+            dropped = ([rest] if rest else []) + sentences[i + 1:]
+            return " ".join(kept + [_overflow_note(dropped, "sentences", reserve, truncated=bool(head and rest))])
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept)
+
+
+def fit_items(items: Iterable[str], budget: int, key: Optional[Callable[[str], float]] = None, sep: str = ", ") -> str:
+    """
+    Joins unique items (best first by `key`, else in the given order) up to
+    about `budget` tokens, summarising the rest. If not even the best item
+    fits, it is cut at the budget.
+    """
+    unique = list(dict.fromkeys(str(i).strip() for i in items if i and str(i).strip()))
+    if key is not None:
+        unique.sort(key=key, reverse=True)
+    if sum(count_tokens(item) + 1 for item in unique) <= budget:
+        return sep.join(unique)
+
+    kept: List[str] = []
+    used = 0
+    reserve = _note_reserve(budget)
+    for i, item in enumerate(unique):
+        cost = count_tokens(item) + 1
+        if used + cost > budget - reserve:
+            if not kept:
+                kept.append(_cut(item, budget - reserve - 1))
+                i += 1
+            return sep.join(kept + ([_overflow_note(unique[i:], "items", reserve)] if unique[i:] else []))
+        kept.append(item)
+        used += cost
+    return sep.join(kept)
+
+
+# --------------------------------------------------
+# Metrics
+# --------------------------------------------------
+class PromptMetrics:
+
+    def __init__(self):
+        self._stats: Dict[str, dict] = defaultdict(lambda: {
+            "calls": 0, "compressed_calls": 0, "input_tokens": 0, "prompt_tokens": 0, "max_prompt_tokens": 0,
+        })
+        self._lock = threading.Lock()
+
+    def record(self, name: str, input_tokens: int, prompt_tokens: int):
+        with self._lock:
+            s = self._stats[name]
+            s["calls"] += 1
+            s["compressed_calls"] += prompt_tokens < input_tokens
+            s["input_tokens"] += input_tokens
+            s["prompt_tokens"] += prompt_tokens
+            s["max_prompt_tokens"] = max(s["max_prompt_tokens"], prompt_tokens)
+        logger.debug("Prompt %s: %d tokens (%d before budgeting)", name, prompt_tokens, input_tokens)
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {**s, "avg_prompt_tokens": s["prompt_tokens"] / s["calls"] if s["calls"] else 0.0}
+                for name, s in self._stats.items()
+            }
+
+
+prompt_metrics = PromptMetrics()
+
+
+# --------------------------------------------------
+# Builder
+# --------------------------------------------------
+class PromptBuilder:
+    """
+    Fills a `str.format` template whose fields are budgeted sections:
+
+        PromptBuilder("executive_summary", template)
+            .text("rfp_summary", summary, budget=800)
+            .items("products", names, budget=200)
+            .build()
+
+    Fields added with `raw` are inserted as-is.
+    """
+
+    def __init__(self, name: str, template: str, budgets: Optional[Dict[str, int]] = None):
+        self.name = name
+        self.template = template
+        # Per-field overrides (settings.PROMPT_BUDGETS["<name>.<field>"])
+        self.budgets = budgets or {}
+        self._fields: Dict[str, str] = {}
+        self._input_tokens = 0
+
+    def _budget(self, field: str, default: int) -> int:
+        return self.budgets.get(f"{self.name}.{field}", default)
+
+    def raw(self, field: str, value: str) -> "PromptBuilder":
+        self._fields[field] = value
+        self._input_tokens += count_tokens(value)
+        return self
+
+    def text(self, field: str, value: str, budget: int) -> "PromptBuilder":
+        self._input_tokens += count_tokens(value or "")
+        self._fields[field] = fit_text(value, self._budget(field, budget))
+        return self
+
+    def items(self, field: str, values: Iterable[str], budget: int, key: Optional[Callable[[str], float]] = None) -> "PromptBuilder":
+        values = list(values)
+        self._input_tokens += sum(count_tokens(str(v)) + 1 for v in values if v)
+        self._fields[field] = fit_items(values, self._budget(field, budget), key=key)
+        return self
+
+    def build(self) -> str:
+        prompt = self.template.format(**self._fields)
+        fixed = count_tokens(self.template.format(**{k: "" for k in self._fields}))
+        prompt_metrics.record(self.name, fixed + self._input_tokens, count_tokens(prompt))
+        return prompt
@@ -0,0 +1,128 @@
+"""In-process exact vector search over product embeddings"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.embedding_codec import decode_matrix
+
+logger = logging.getLogger(__name__)
+
+_PROJECTION = {"_id": 0, "sku": 1, "name": 1, "description": 1, "embedding": 1}
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorIndex:
+    """
+    Product embeddings loaded into one contiguous float32 matrix with unit
+    rows, so top-k cosine search is a single matmul plus argpartition and a
+    batch of queries is one matrix product.
+
+    Scores use Atlas' cosine convention, (1 + cos) / 2, so results are
+    interchangeable with `$vectorSearch`.
+
+    The index reloads itself when `mark_stale()` was called (e.g. after new
+    product embeddings were written) or, every `refresh_interval` seconds,
+    when the number of embedded products in the collection has changed.
+    """
+
+    def __init__(self, products_col, embedding_field: str = "embedding", refresh_interval: float = 300.0):
+        self.products_col = products_col
+        self.embedding_field = embedding_field
+        self.refresh_interval = refresh_interval
+
+        self.matrix: Optional[np.ndarray] = None
+        self.products: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._stale = True
+        self._loaded_count = -1
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # Loading
+    # --------------------------------------------------
+    def _embedded_filter(self) -> dict:
+        return {self.embedding_field: {"$exists": True, "$ne": None}}
+
+    def load(self):
+        products, vectors = [], []
+        for doc in self.products_col.find(self._embedded_filter(), _PROJECTION):
+            vectors.append(doc.pop(self.embedding_field))
+            products.append(doc)
+
+        matrix = normalize_rows(decode_matrix(vectors))
+
+        with self._lock:
+            self.matrix = np.ascontiguousarray(matrix)
+            self.products = products
+            self._rows = {p["sku"]: i for i, p in enumerate(products) if p.get("sku")}
+            self._loaded_count = len(products)
+            self._stale = False
+            self._checked_at = time.monotonic()
+        logger.info("Loaded %d product embeddings into local vector index", len(products))
+
+    def mark_stale(self):
+        self._stale = True
+
+    def refresh_if_needed(self):
+        if not self._stale and time.monotonic() - self._checked_at > self.refresh_interval:
+            self._checked_at = time.monotonic()
+            if self.products_col.count_documents(self._embedded_filter()) != self._loaded_count:
+                self._stale = True
+        if self._stale:
+            self.load()
+
+    # --------------------------------------------------
+    # Search
+    # --------------------------------------------------
+    def search_batch(self, queries: Sequence[Sequence[float]], top_k: int = 3) -> List[List[Dict]]:
+        """Top-k products for each query vector. Empty queries get []."""
+        self.refresh_if_needed()
+        with self._lock:
+            matrix, products = self.matrix, self.products
+
+        results: List[List[Dict]] = [[] for _ in queries]
+        valid = [i for i, q in enumerate(queries) if q is not None and len(q)]
+        if not valid or matrix.shape[0] == 0:
+            return results
+
+        q = normalize_rows(np.asarray([queries[i] for i in valid], dtype=np.float32))
+        sims = q @ matrix.T  # (queries, products) cosine similarities
+
+        k = min(top_k, matrix.shape[0])
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        for row, i in enumerate(valid):
+            idx = top[row][np.argsort(-sims[row, top[row]])]
+            results[i] = [
+                {**products[j], "_score": float((1.0 + sims[row, j]) / 2.0)}
+                for j in idx
+            ]
+        return results
+
+    def search(self, query: Sequence[float], top_k: int = 3) -> List[Dict]:
+        return self.search_batch([query], top_k)[0]
+
+    def score_candidates(self, queries: Sequence[Sequence[float]], candidates: Sequence[Sequence[str]]) -> List[Dict[str, float]]:
+        """{sku: score} of each query against only its candidate SKUs."""
+        self.refresh_if_needed()
+        with self._lock:
+            matrix, rows_by_sku = self.matrix, self._rows
+
+        results: List[Dict[str, float]] = []
+        for query, skus in zip(queries, candidates):
+            skus = [s for s in skus if s in rows_by_sku]
+            if query is None or not len(query) or not skus:
+                results.append({})
+                continue
+            q = normalize_rows(np.asarray([query], dtype=np.float32))[0]
+            sims = matrix[[rows_by_sku[s] for s in skus]] @ q
+            results.append({s: float((1.0 + c) / 2.0) for s, c in zip(skus, sims)})
+        return results
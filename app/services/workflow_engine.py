@@ -0,0 +1,216 @@
+"""DAG workflow engine: runs agent stages as soon as their inputs are ready"""
+import asyncio
+import inspect
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.db.models import StageStatus, WorkflowStage
+from app.event_bus.event_types import STAGE_INPUTS, topological_order
+from app.services.checkpoints import CheckpointStore, stage_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# handler(rfp_doc, inputs) -> output. `inputs` maps each upstream stage to
+# its output. Returning None fails the stage without raising.
+StageHandler = Callable[[dict, Dict[str, Any]], Any]
+
+
+class WorkflowEngine:
+    """
+    Schedules the stage DAG from `STAGE_INPUTS` for each RFP.
+
+    Every stage whose inputs are complete is started at once, so independent
+    branches overlap and one RFP takes as long as its critical path. A failed
+    stage marks everything downstream as skipped while unrelated branches
+    carry on. Up to `max_in_flight` RFPs run together; `concurrency` caps
+    how many instances of a stage run at the same time across all of them.
+
+    `on_update(state)` is called whenever a stage changes status, with a
+    dict shaped like `WorkflowModel`.
+
+    With a `checkpoints` store every completed stage is saved together with
+    a fingerprint of its inputs. When the workflow runs again (a retry or a
+    restart after a deploy), stages whose checkpoint matches the current
+    fingerprint are restored instead of recomputed.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, StageHandler],
+        stage_inputs: Optional[Dict[str, List[str]]] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        max_in_flight: int = 10,
+        on_update: Optional[Callable[[dict], Any]] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        stage_versions: Optional[Dict[str, str]] = None,
+        external_inputs: Optional[Dict[str, StageHandler]] = None,
+    ):
+        self.stage_inputs = stage_inputs or STAGE_INPUTS
+        missing = set(self.stage_inputs) - set(handlers)
+        if missing:
+            raise ValueError(f"No handler for stages: {sorted(missing)}")
+
+        self.handlers = handlers
+        self.order = topological_order(self.stage_inputs)
+        concurrency = concurrency or {}
+        self._limits = {s: asyncio.Semaphore(concurrency.get(s, 1)) for s in self.stage_inputs}
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self.on_update = on_update
+        self.checkpoints = checkpoints
+        # Bump a stage's version to invalidate its checkpoints after a logic change
+        self.stage_versions = stage_versions or {}
+        # stage -> (rfp_doc, inputs) -> data the stage reads from outside the
+        # DAG; it is part of the stage's fingerprint, so a change reruns it
+        self.external_inputs = external_inputs or {}
+
+        self._tasks: set = set()
+        self._accepting = True
+
+    # --------------------------------------------------
+    # Per-RFP run
+    # --------------------------------------------------
+    async def _call(self, handler: StageHandler, *args) -> Any:
+        if inspect.iscoroutinefunction(handler):
+            return await handler(*args)
+        return await asyncio.to_thread(handler, *args)
+
+    async def _run_stage(
+        self,
+        stage: str,
+        rfp_doc: dict,
+        outputs: Dict[str, Any],
+        hashes: Dict[str, str],
+        saved: Dict[str, dict],
+        state: dict,
+    ) -> Any:
+        deps = self.stage_inputs[stage]
+        inputs = {dep: outputs[dep] for dep in deps}
+        external = None
+        if self.checkpoints is not None and stage in self.external_inputs:
+            external = await self._call(self.external_inputs[stage], rfp_doc, inputs)
+        input_hash = stage_fingerprint(
+            stage, rfp_doc, {dep: hashes[dep] for dep in deps}, self.stage_versions.get(stage, "1"), external
+        )
+        hashes[stage] = input_hash
+
+        if self.checkpoints is not None and self.checkpoints.is_fresh(saved.get(stage), input_hash):
+            state.setdefault("resumed_stages", []).append(stage)
+            logger.info("Stage %s restored from checkpoint for RFP %s", stage, state["rfp_id"])
+            return saved[stage]["output"]
+
+        async with self._limits[stage]:
+            result = await self._call(self.handlers[stage], rfp_doc, inputs)
+
+        if result is not None and self.checkpoints is not None:
+            try:
+                await asyncio.to_thread(self.checkpoints.save, state["rfp_id"], stage, input_hash, result)
+            except Exception:
+                logger.exception("Could not checkpoint stage %s for RFP %s", stage, state["rfp_id"])
+        return result
+
+    async def _publish(self, state: dict):
+        if self.on_update is None:
+            return
+        state["updated_at"] = datetime.utcnow()
+        try:
+            await self._call(self.on_update, state)
+        except Exception:
+            logger.exception("Workflow update hook failed for %s", state["rfp_id"])
+
+    async def run(self, rfp_doc: dict) -> dict:
+        """Runs the whole DAG for one RFP and returns the final workflow state."""
+        status = {s: StageStatus.PENDING for s in self.order}
+        outputs: Dict[str, Any] = {}
+        hashes: Dict[str, str] = {}
+        running: Dict[asyncio.Task, str] = {}
+        saved: Dict[str, dict] = {}
+        if self.checkpoints is not None:
+            saved = await asyncio.to_thread(self.checkpoints.load, rfp_doc["_id"])
+        state = {
+            "rfp_id": rfp_doc["_id"],
+            "current_stage": WorkflowStage.ANALYSIS,
+            "running_stages": [],
+            "stage_status": status,
+            "agent_results": outputs,
+            "created_at": datetime.utcnow(),
+        }
+
+        while True:
+            for stage in self.order:
+                if status[stage] != StageStatus.PENDING:
+                    continue
+                deps = self.stage_inputs[stage]
+                if any(status[d] in (StageStatus.FAILED, StageStatus.SKIPPED) for d in deps):
+                    status[stage] = StageStatus.SKIPPED
+                elif all(status[d] == StageStatus.COMPLETED for d in deps):
+                    status[stage] = StageStatus.RUNNING
+                    task = asyncio.create_task(
+                        self._run_stage(stage, rfp_doc, outputs, hashes, saved, state)
+                    )
+                    running[task] = stage
+
+            state["running_stages"] = sorted(running.values())
+            if running:
+                state["current_stage"] = state["running_stages"][0]
+            await self._publish(state)
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = running.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.exception("Stage %s failed for RFP %s", stage, state["rfp_id"])
+                    status[stage] = StageStatus.FAILED
+                    state.setdefault("errors", {})[stage] = str(e)
+                    continue
+
+                if result is None:
+                    status[stage] = StageStatus.FAILED
+                else:
+                    status[stage] = StageStatus.COMPLETED
+                    outputs[stage] = result
+
+        failed = any(s != StageStatus.COMPLETED for s in status.values())
+        state["current_stage"] = WorkflowStage.FAILED if failed else WorkflowStage.COMPLETED
+        await self._publish(state)
+        return state
+
+    # --------------------------------------------------
+    # Many RFPs
+    # --------------------------------------------------
+    async def _run_bounded(self, rfp_doc: dict) -> Optional[dict]:
+        try:
+            return await self.run(rfp_doc)
+        except Exception:
+            logger.exception("Workflow crashed for RFP %s", rfp_doc.get("_id"))
+            return None
+        finally:
+            self._in_flight.release()
+
+    async def submit(self, rfp_doc: dict) -> asyncio.Task:
+        """Starts a workflow, waiting while `max_in_flight` are already running."""
+        if not self._accepting:
+            raise RuntimeError("Workflow engine is not accepting work")
+        await self._in_flight.acquire()
+        if not self._accepting:
+            self._in_flight.release()
+            raise RuntimeError("Workflow engine is not accepting work")
+        task = asyncio.create_task(self._run_bounded(rfp_doc))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def shutdown(self, drain: bool = True):
+        """Stops accepting RFPs; with `drain`, waits for running workflows."""
+        self._accepting = False
+        tasks = list(self._tasks)
+        if not drain:
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("Workflow engine stopped")